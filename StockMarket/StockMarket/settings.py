@@ -47,7 +47,8 @@ INSTALLED_APPS = [
 ]
 
 REST_FRAMEWORK = {
-    'DEFAULT_AUTHENTICATION_CLASSES': ('knox.auth.TokenAuthentication',)
+    # Knox tokens, with validated tokens cached in process (see accounts/auth.py).
+    'DEFAULT_AUTHENTICATION_CLASSES': ('accounts.auth.CachedTokenAuthentication',)
 }
 
 MIDDLEWARE = [
@@ -79,6 +80,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'StockMarket.wsgi.application'
+ASGI_APPLICATION = 'StockMarket.asgi.application'
 
 
 # Database
@@ -102,6 +104,18 @@ DATABASES = {
     }
 }
 
+# Cache
+# File based, so the price data version bumped by import_all_csv (a separate
+# process) is seen by the web server without running a cache service.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    }
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/2.1/ref/settings/#auth-password-validators
 
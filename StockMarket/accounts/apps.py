@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class AccountsConfig(AppConfig):
     name = 'accounts'
+
+    def ready(self):
+        # Connect the receiver that drops deleted tokens from the auth cache.
+        from accounts import auth  # noqa: F401
@@ -0,0 +1,145 @@
+import binascii
+import copy
+import threading
+import time
+from collections import OrderedDict
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from knox.auth import TokenAuthentication
+from knox.crypto import hash_token
+from knox.models import get_token_model
+from knox.settings import knox_settings
+from rest_framework import exceptions
+
+# Most recently used tokens kept per process, and how long (in seconds) one is
+# trusted before it is looked up in the database again.
+TOKEN_CACHE_SIZE = 1024
+TOKEN_CACHE_TTL = 60
+
+# At most this often (in seconds) a process checks, in one query, that its cached
+# tokens still exist and belong to active users. This bounds how long a token
+# deleted or a user deactivated by another process stays usable here.
+TOKEN_REVALIDATE_SECONDS = 1
+
+
+class TokenCache:
+    """
+    Thread-safe LRU of ``digest -> (user, auth_token, cached_at)`` for tokens
+    that passed Knox's checks, evicting the least recently used beyond ``size``.
+    """
+
+    def __init__(self, size=TOKEN_CACHE_SIZE, ttl=TOKEN_CACHE_TTL, revalidate_seconds=TOKEN_REVALIDATE_SECONDS):
+        self.size = size
+        self.ttl = ttl
+        self.revalidate_seconds = revalidate_seconds
+        self.revalidated_at = time.monotonic()
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, digest):
+        """
+        Return copies of the cached ``(user, auth_token)``, so concurrent
+        requests never share (or modify) the same instances, or None.
+        """
+        self.revalidate()
+        with self.lock:
+            entry = self.entries.get(digest)
+            if entry is None:
+                return None
+            user, auth_token, cached_at = entry
+            expired = auth_token.expiry is not None and auth_token.expiry < timezone.now()
+            if expired or time.monotonic() - cached_at > self.ttl:
+                del self.entries[digest]
+                return None
+            self.entries.move_to_end(digest)
+        user, auth_token = copy.copy(user), copy.copy(auth_token)
+        auth_token.user = user
+        return user, auth_token
+
+    def revalidate(self):
+        """
+        Drop entries whose token was deleted or whose user was deactivated,
+        checking the database at most every ``revalidate_seconds``.
+        """
+        with self.lock:
+            now = time.monotonic()
+            if now - self.revalidated_at < self.revalidate_seconds:
+                return
+            self.revalidated_at = now
+            digests = list(self.entries)
+        if not digests:
+            return
+        valid = set(get_token_model().objects.filter(
+            digest__in=digests, user__is_active=True,
+        ).values_list('digest', flat=True))
+        with self.lock:
+            for digest in digests:
+                if digest not in valid:
+                    self.entries.pop(digest, None)
+
+    def set(self, digest, user, auth_token):
+        with self.lock:
+            self.entries[digest] = (user, auth_token, time.monotonic())
+            self.entries.move_to_end(digest)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def discard(self, digest):
+        with self.lock:
+            self.entries.pop(digest, None)
+
+    def discard_user(self, user_id):
+        with self.lock:
+            for digest in [digest for digest, (user, _, _) in self.entries.items() if user.pk == user_id]:
+                del self.entries[digest]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+token_cache = TokenCache()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Knox TokenAuthentication that remembers validated tokens in
+    :data:`token_cache`, so repeat requests with the same token skip the
+    database lookups. Tokens are dropped from the cache when they are deleted
+    (e.g. by LogoutAPI) or their user is deactivated (in other processes
+    within TOKEN_REVALIDATE_SECONDS), expire, or after TOKEN_CACHE_TTL.
+    """
+
+    def authenticate_credentials(self, token):
+        try:
+            digest = hash_token(token.decode('utf-8'))
+        except (TypeError, UnicodeDecodeError, binascii.Error):
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+
+        cached = token_cache.get(digest)
+        if cached is not None:
+            user, auth_token = cached
+            if knox_settings.AUTO_REFRESH and auth_token.expiry:
+                self.renew_token(auth_token)
+            return user, auth_token
+
+        user, auth_token = super().authenticate_credentials(token)
+        token_cache.set(digest, user, auth_token)
+        return user, auth_token
+
+
+@receiver(post_delete, sender=get_token_model(), dispatch_uid='accounts.auth.discard_deleted_token')
+def discard_deleted_token(sender, instance, **kwargs):
+    # Logging out (or any other token deletion) takes effect immediately in this
+    # process; other processes notice when they next revalidate.
+    token_cache.discard(instance.digest)
+
+
+@receiver(post_save, sender=get_user_model(), dispatch_uid='accounts.auth.discard_inactive_user')
+def discard_inactive_user(sender, instance, **kwargs):
+    # Tokens of a deactivated user go back through Knox, which rejects them.
+    if not instance.is_active:
+        token_cache.discard_user(instance.pk)
@@ -1,3 +1,68 @@
+from django.contrib.auth.models import User
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from knox.models import AuthToken
+from accounts.auth import TOKEN_REVALIDATE_SECONDS, token_cache
 
-# Create your tests here.
+
+class CachedTokenAuthenticationTests(TestCase):
+    """
+    Tokens cached by one process must stop working once they are revoked:
+    at once in the process that revoked them, and within
+    TOKEN_REVALIDATE_SECONDS in the others.
+    """
+
+    def setUp(self):
+        token_cache.clear()
+        self.addCleanup(token_cache.clear)
+        self.user = User.objects.create_user('trader', password='secret')
+        response = self.client.post('/api/auth/login', {'username': 'trader', 'password': 'secret'})
+        self.auth = {'HTTP_AUTHORIZATION': f"Token {response.json()['token']}"}
+
+    def get_user(self):
+        return self.client.get('/api/auth/user', **self.auth)
+
+    def in_another_process(self, revoke):
+        # Revoke, then put the entry back, as a worker that did not serve the revoking request still has it.
+        self.assertEqual(self.get_user().status_code, 200)
+        entries = dict(token_cache.entries)
+        revoke()
+        token_cache.entries.update(entries)
+        # Its next check against the database is due.
+        token_cache.revalidated_at -= TOKEN_REVALIDATE_SECONDS
+
+    def test_token_rejected_after_logout(self):
+        self.assertEqual(self.get_user().status_code, 200)
+        self.assertEqual(self.client.post('/api/auth/logout/', **self.auth).status_code, 200)
+        self.assertEqual(self.get_user().status_code, 401)
+
+    def test_token_rejected_after_logout_in_another_process(self):
+        self.in_another_process(lambda: self.client.post('/api/auth/logout/', **self.auth))
+        self.assertEqual(self.get_user().status_code, 401)
+
+    def test_token_rejected_after_user_deactivated(self):
+        self.assertEqual(self.get_user().status_code, 200)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.get_user().status_code, 401)
+        self.assertTrue(AuthToken.objects.filter(user=self.user).exists())
+
+    def test_token_rejected_after_user_deactivated_in_another_process(self):
+        self.in_another_process(lambda: User.objects.filter(pk=self.user.pk).update(is_active=False))
+        self.assertEqual(self.get_user().status_code, 401)
+
+    def test_cache_hits_skip_the_database(self):
+        self.get_user()
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.get_user().status_code, 200)
+        self.assertEqual(len(queries.captured_queries), 0)
+
+    def test_cache_hits_get_their_own_instances(self):
+        self.get_user()
+        digest = next(iter(token_cache.entries))
+        (user, token), (other_user, other_token) = token_cache.get(digest), token_cache.get(digest)
+        self.assertIsNot(user, other_user)
+        self.assertIsNot(token, other_token)
+        self.assertIs(token.user, user)
+        self.assertEqual(user.pk, self.user.pk)
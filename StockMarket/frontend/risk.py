@@ -1,30 +1,117 @@
-import quantstats as qs
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
 import warnings
 import os
 
+TRADING_DAYS = 252
+RISK_FREE_RATE = 0.01  # Assuming a risk-free rate of 1%
+RISK_FACTORS = ['volatility', 'sharpe_ratio', 'max_drawdown']
+DEFAULT_WEIGHTS = {'volatility': 0.5, 'sharpe_ratio': 0.3, 'max_drawdown': 0.2}
+
+
+#pivot long stock data (one row per date and symbol) into a date x ticker matrix of closes
+def pivot_closes(stock_data, symbol_column='Symbol', close_column='Close'):
+    return stock_data.pivot_table(
+        index=stock_data.index, columns=symbol_column, values=close_column, aggfunc='last'
+    ).sort_index()
+
+
+#daily returns of every column of a date x ticker close matrix
+def daily_returns(closes):
+    values = np.asarray(closes, dtype=float)
+    # Compare each close with the ticker's previous close, skipping dates on which
+    # the ticker has no price, so the result matches a per-ticker pct_change().
+    previous = pd.DataFrame(values).ffill().shift(1).to_numpy()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        returns = values / previous - 1
+    returns[~np.isfinite(returns)] = np.nan
+    return returns
+
+
+#sharpe ratio of every column of a date x ticker matrix of daily returns, in excess of the
+#de-annualized risk-free rate (as quantstats.stats.sharpe)
+def sharpe_ratios(returns, rf=RISK_FREE_RATE, periods=TRADING_DAYS):
+    with warnings.catch_warnings(), np.errstate(divide='ignore', invalid='ignore'):
+        # Tickers with fewer than two returns give NaN, like pandas does.
+        warnings.simplefilter('ignore', category=RuntimeWarning)
+        excess = returns - (np.power(1 + rf, 1.0 / periods) - 1.0)
+        return np.nanmean(excess, axis=0) / np.nanstd(excess, axis=0, ddof=1) * np.sqrt(periods)
+
+
+#max drawdown of the compounded daily returns of every column against a starting equity of 1.0
+#(as quantstats.stats.max_drawdown)
+def max_drawdowns(returns):
+    equity = np.cumprod(1 + np.nan_to_num(returns), axis=0)
+    peak = np.maximum(np.maximum.accumulate(equity, axis=0), 1.0)
+    return (equity / peak).min(axis=0, initial=1.0) - 1
+
+
+#calculate volatility, sharpe ratio and max drawdown for every ticker of a date x ticker close matrix at once
+def risk_metrics(closes, rf=RISK_FREE_RATE, periods=TRADING_DAYS):
+    returns = daily_returns(closes)
+
+    with warnings.catch_warnings(), np.errstate(divide='ignore', invalid='ignore'):
+        # Tickers with fewer than two returns give NaN, like pandas does.
+        warnings.simplefilter('ignore', category=RuntimeWarning)
+
+        # Annualized volatility
+        volatility = np.nanstd(returns, axis=0, ddof=1) * np.sqrt(periods)
+
+    return pd.DataFrame(
+        {
+            'volatility': volatility,
+            'sharpe_ratio': sharpe_ratios(returns, rf, periods),
+            'max_drawdown': max_drawdowns(returns),
+        },
+        index=getattr(closes, 'columns', None),
+    )
+
+
+#covariance and correlation matrices of the daily returns of every pair of tickers of a date x ticker close matrix
+def return_comoments(closes):
+    returns = daily_returns(closes)
+    # Each pair only uses the dates on which both tickers have a return (as DataFrame.cov() and .corr()),
+    # so the statistics of any subset of tickers are a slice of the full matrices.
+    valid = ~np.isnan(returns)
+    x = np.where(valid, returns, 0.0)
+    both = valid.astype(float)
+
+    count = both.T @ both
+    sums = x.T @ both  # [i, j]: sum of i's returns on the dates j has one too
+    squares = (x * x).T @ both
+    with np.errstate(divide='ignore', invalid='ignore'):
+        products = x.T @ x - sums * sums.T / count
+        deviations = squares - sums * sums / count
+        covariance = products / (count - 1)
+        correlation = np.clip(products / np.sqrt(deviations * deviations.T), -1.0, 1.0)
+    covariance[count < 2] = np.nan
+    correlation[count < 2] = np.nan
+
+    columns = getattr(closes, 'columns', None)
+    return (
+        pd.DataFrame(covariance, index=columns, columns=columns),
+        pd.DataFrame(correlation, index=columns, columns=columns),
+    )
+
+
+#weighted summation of the risk factors of each ticker
+def risk_score(metrics, weights=None):
+    weights = weights or DEFAULT_WEIGHTS
+    return sum(metrics[risk_factor] * weights.get(risk_factor, 0) for risk_factor in RISK_FACTORS)
+
+
 #calculate risk factor for given stock data
 def calculate_risk(stock_data, stock_name, risk_factor):
-    # Calculate daily returns
-    stock_data['daily_return'] = stock_data['Close'].pct_change()
-    
-    # Calculate risk factor based on the specified type
-    if risk_factor == 'volatility':
-        risk_value = stock_data['daily_return'].std() * np.sqrt(252)  # Annualized volatility
-    elif risk_factor == 'sharpe_ratio':
-        risk_value = qs.stats.sharpe(stock_data['daily_return'], rf=0.01)  # Assuming a risk-free rate of 1%
-    elif risk_factor == 'max_drawdown':
-        risk_value = qs.stats.max_drawdown(stock_data['daily_return'])
-    else:
+    if risk_factor not in RISK_FACTORS:
         raise ValueError("Invalid risk factor type. Choose from 'volatility', 'sharpe_ratio', or 'max_drawdown'.")
-    
-    return {stock_name: risk_value}
+
+    metrics = risk_metrics(stock_data[['Close']])
+    return {stock_name: metrics[risk_factor].iloc[0]}
 
 
 if __name__ == "__main__":
+    import matplotlib.pyplot as plt
+
     # Suppress warnings
     warnings.filterwarnings("ignore")
 
@@ -34,21 +121,11 @@ if __name__ == "__main__":
     # Set the Date column as the index
     stock_data.set_index('Date', inplace=True)
 
-    # Calculate risk factors for each stock
-    risk_factors = ['volatility', 'sharpe_ratio', 'max_drawdown']
-    risk_data = {}
-
-    for risk_factor in risk_factors:
-        risk_data[risk_factor] = {}
-        for stock_name in stock_data['Symbol'].unique():
-            stock_data_filtered = stock_data[stock_data['Symbol'] == stock_name]
-            risk_data[risk_factor].update(calculate_risk(stock_data_filtered, stock_name, risk_factor))
-
-    # Create a DataFrame from the risk data
-    risk_df = pd.DataFrame(risk_data)
+    # Calculate risk factors for every stock in one pass over a date x ticker matrix
+    risk_df = risk_metrics(pivot_closes(stock_data))
 
     #for each row of risk_df, calculate weighted summation where I can specify the 3 weights of all the risk factors
-    risk_df['risk_score'] = risk_df['volatility'] * 0.5 + risk_df['sharpe_ratio'] * 0.3 + risk_df['max_drawdown'] * 0.2
+    risk_df['risk_score'] = risk_score(risk_df, DEFAULT_WEIGHTS)
 
 
     # Plot the risk factors
@@ -65,4 +142,4 @@ if __name__ == "__main__":
     plt.show()
 
     # Save the risk data to a CSV file
-    risk_df.to_csv('risk_data.csv', index=False)
\ No newline at end of file
+    risk_df.to_csv('risk_data.csv', index=False)
@@ -0,0 +1,19 @@
+# Gunicorn settings, read automatically when run from this directory:
+#   gunicorn StockMarket.asgi:application
+import multiprocessing
+import os
+
+bind = os.environ.get('BIND', '0.0.0.0:8000')
+
+# Uvicorn workers serve the ASGI application, so each process handles many
+# concurrent requests; one process per CPU is enough.
+worker_class = 'uvicorn_worker.UvicornWorker'
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+
+# Restart a worker that stops responding, and give open requests time to finish on shutdown.
+timeout = 60
+graceful_timeout = 30
+keepalive = 5
+
+accesslog = '-'
+errorlog = '-'
@@ -0,0 +1,302 @@
+import math
+from datetime import timedelta
+import numpy as np
+import pandas as pd
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, DateField, Exists, OuterRef, Q, Subquery, Value, When
+from frontend.risk import (
+    RISK_FACTORS, TRADING_DAYS, max_drawdowns, return_comoments, risk_metrics, risk_score, sharpe_ratios,
+)
+from stocks.caching import price_data_version
+from stocks.models import Stock, StockMetric, StockPrice
+
+# Rolling windows, in trading days, of the StockMetric columns.
+VOLATILITY_WINDOWS = (20, 60, 252)
+DRAWDOWN_WINDOW = 252
+SMA_WINDOWS = (20, 50, 200)
+# The full-universe return matrices are cached per price data version (see stocks.caching).
+COMOMENTS_CACHE_SECONDS = 24 * 60 * 60
+# Prices needed before the first recomputed day: a full window of returns,
+# each of which needs the close before it.
+METRIC_LOOKBACK = max(*VOLATILITY_WINDOWS, DRAWDOWN_WINDOW, *SMA_WINDOWS)
+
+
+def close_matrix(stock_ids, date_from=None, date_to=None):
+    """
+    Return a date x stock_id DataFrame of close prices (NaN where a stock has
+    no price), loaded with a single values_list query and scattered into a
+    NumPy array without per-row Python objects beyond the query result.
+    """
+    stock_ids = list(stock_ids)
+    queryset = StockPrice.objects.filter(stock__in=stock_ids, close_price__isnull=False)
+    if date_from:
+        queryset = queryset.filter(date__gte=date_from)
+    if date_to:
+        queryset = queryset.filter(date__lte=date_to)
+
+    return date_matrix(queryset.order_by().values_list('date', 'stock_id', 'close_price'), stock_ids)
+
+
+def date_matrix(rows, stock_ids):
+    """
+    Scatter ``(date, stock_id, value)`` rows into a date x stock_id DataFrame
+    (NaN where a stock has no value).
+    """
+    rows = list(rows)
+    if not rows:
+        return pd.DataFrame(index=pd.DatetimeIndex([]), columns=stock_ids, dtype=float)
+
+    dates, owners, values = zip(*rows)
+    index, row_positions = np.unique(np.array(dates, dtype='datetime64[D]'), return_inverse=True)
+    column_of = {stock_id: position for position, stock_id in enumerate(stock_ids)}
+    column_positions = np.fromiter((column_of[owner] for owner in owners), dtype=np.intp, count=len(owners))
+
+    matrix = np.full((len(index), len(stock_ids)), np.nan)
+    matrix[row_positions, column_positions] = np.array(values, dtype=float)
+    return pd.DataFrame(matrix, index=pd.DatetimeIndex(index), columns=stock_ids)
+
+
+def clean_float(value):
+    # JSON has no NaN/Infinity; undefined metrics are returned as null.
+    value = float(value)
+    return value if math.isfinite(value) else None
+
+
+def risk_rows(metrics, weights):
+    """
+    Turn a risk_metrics() frame into ``{column: {factor: value, ..., 'risk_score': value}}``.
+    """
+    metrics = metrics.assign(risk_score=risk_score(metrics, weights))
+    return {
+        column: {name: clean_float(value) for name, value in row.items()}
+        for column, row in zip(metrics.index, metrics[[*RISK_FACTORS, 'risk_score']].to_dict('records'))
+    }
+
+
+def stock_risk(stock_ids, weights, date_from=None, date_to=None, window=None):
+    """
+    Risk factors and weighted risk score of every stock, keyed by stock id:
+    over its last ``window`` trading days from StockMetric if given, otherwise
+    over the date range from StockPrice.
+    """
+    if window:
+        return risk_rows(stored_risk_metrics(stock_ids, window), weights)
+    return risk_rows(risk_metrics(close_matrix(stock_ids, date_from, date_to)), weights)
+
+
+def stored_risk_metrics(stock_ids, window):
+    """
+    risk_metrics() of every stock over its last ``window`` daily returns (one
+    of VOLATILITY_WINDOWS), read from StockMetric instead of recomputed from
+    prices: the stored rolling volatility, and the Sharpe ratio and max
+    drawdown of the stored daily returns. Stocks with fewer returns get NaN.
+    """
+    stock_ids = list(stock_ids)
+    latest = StockMetric.objects.filter(stock=OuterRef('pk')).order_by('-date')
+    rows = Stock.objects.filter(pk__in=stock_ids).annotate(
+        start=Subquery(latest.values('date')[window - 1:window]),
+        volatility=Subquery(latest.values(f'volatility_{window}')[:1]),
+    ).values_list('pk', 'start', 'volatility')
+    starts = {}
+    volatility = pd.Series(np.nan, index=stock_ids)
+    for stock_id, start, value in rows:
+        if start is not None and value is not None:
+            starts[stock_id] = start
+            volatility[stock_id] = value
+
+    ranges = Q()
+    for stock_id, start in starts.items():
+        ranges |= Q(stock=stock_id, date__gte=start)
+    returns = date_matrix(
+        StockMetric.objects.filter(ranges).order_by().values_list('date', 'stock_id', 'daily_return')
+        if starts else [],
+        stock_ids,
+    ).to_numpy()
+    max_drawdown = np.where(volatility.notna(), max_drawdowns(returns), np.nan)
+    return pd.DataFrame(
+        {'volatility': volatility.to_numpy(), 'sharpe_ratio': sharpe_ratios(returns), 'max_drawdown': max_drawdown},
+        index=stock_ids,
+    )
+
+
+def window_start(stock_ids, window):
+    """
+    Date of the price before the last ``window`` trading days of the given
+    stocks, so prices from it on give ``window`` daily returns; None if they
+    have fewer.
+    """
+    dates = StockPrice.objects.filter(stock__in=stock_ids).order_by('-date').values_list('date', flat=True)
+    return next(iter(dates.distinct()[window:window + 1]), None)
+
+
+def portfolio_values(closes, shares):
+    """
+    Daily market value of a portfolio holding ``shares`` (aligned with the
+    columns of ``closes``): forward-fill each stock's last close across days it
+    did not trade and multiply the date x stock matrix by the share vector.
+    Holdings without any price in ``closes`` are left out, and days before
+    every other holding has a price are dropped.
+    """
+    priced = closes.notna().any().to_numpy()
+    filled = closes.loc[:, priced].ffill().dropna()
+    return pd.Series(filled.to_numpy() @ np.asarray(shares, dtype=float)[priced], index=filled.index)
+
+
+def rolling_metrics(closes):
+    """
+    Daily return, rolling volatilities, rolling drawdown and moving averages of a
+    date-indexed Series of close prices, as a DataFrame with one column per
+    StockMetric field. Values stay NaN until their window is full.
+    """
+    returns = closes.pct_change()
+    metrics = {'daily_return': returns}
+    for window in VOLATILITY_WINDOWS:
+        metrics[f'volatility_{window}'] = returns.rolling(window).std() * np.sqrt(TRADING_DAYS)
+    metrics[f'drawdown_{DRAWDOWN_WINDOW}'] = closes / closes.rolling(DRAWDOWN_WINDOW, min_periods=1).max() - 1
+    for window in SMA_WINDOWS:
+        metrics[f'sma_{window}'] = closes.rolling(window).mean()
+    return pd.DataFrame(metrics, index=closes.index)
+
+
+def metric_starts(stock_ids, since=None, rebuild=False):
+    """
+    First date whose StockMetric row has to be (re)computed for each stock:
+    the day after its newest stored row, or ``since[stock_id]`` if earlier
+    prices were rewritten. None means the stock's whole history.
+    """
+    if rebuild:
+        return dict.fromkeys(stock_ids)
+    since = since or {}
+    latest = StockMetric.objects.filter(stock=OuterRef('pk')).order_by('-date')
+    starts = {}
+    rows = Stock.objects.filter(pk__in=stock_ids).annotate(
+        latest_metric=Subquery(latest.values('date')[:1])
+    ).values_list('pk', 'latest_metric')
+    for stock_id, latest_metric in rows:
+        start = latest_metric + timedelta(days=1) if latest_metric else None
+        if start and since.get(stock_id):
+            start = min(start, since[stock_id])
+        starts[stock_id] = start
+    return starts
+
+
+def refresh_metrics(stock_ids, since=None, rebuild=False, chunk_size=100):
+    """
+    Bring the StockMetric rows of the given stocks up to date with their
+    StockPrice rows. Only days from :func:`metric_starts` on are recomputed, each
+    stock loading just the METRIC_LOOKBACK closes before them as warm-up.
+    Returns the number of metric rows written.
+    """
+    written = 0
+    stock_ids = list(stock_ids)
+    for offset in range(0, len(stock_ids), chunk_size):
+        starts = metric_starts(stock_ids[offset:offset + chunk_size], since, rebuild)
+        if starts:
+            written += refresh_metric_chunk(starts)
+    return written
+
+
+def refresh_metric_chunk(starts):
+    # Date of the METRIC_LOOKBACK-th price before each stock's start, and whether
+    # there is any price from the start on, in one query.
+    dated = {stock_id: start for stock_id, start in starts.items() if start}
+    lookback = {}
+    if dated:
+        start = Case(
+            *(When(pk=stock_id, then=Value(start)) for stock_id, start in dated.items()),
+            output_field=DateField(),
+        )
+        warm_up = StockPrice.objects.filter(stock=OuterRef('pk'), date__lt=OuterRef('metric_start')).order_by('-date')
+        pending = StockPrice.objects.filter(stock=OuterRef('pk'), date__gte=OuterRef('metric_start'))
+        rows = Stock.objects.filter(pk__in=dated).annotate(metric_start=start).annotate(
+            lookback=Subquery(warm_up.values('date')[METRIC_LOOKBACK - 1:METRIC_LOOKBACK]),
+            pending=Exists(pending),
+        ).values_list('pk', 'lookback', 'pending')
+        for stock_id, date, has_pending in rows:
+            if has_pending:
+                lookback[stock_id] = date
+            else:
+                # Already up to date.
+                del starts[stock_id]
+        if not starts:
+            return 0
+
+    ranges = Q()
+    for stock_id in starts:
+        if lookback.get(stock_id):
+            ranges |= Q(stock=stock_id, date__gte=lookback[stock_id])
+        else:
+            ranges |= Q(stock=stock_id)
+    rows = StockPrice.objects.filter(ranges, close_price__isnull=False).order_by('stock_id', 'date').values_list(
+        'stock_id', 'date', 'close_price'
+    )
+
+    closes = {stock_id: ([], []) for stock_id in starts}
+    for stock_id, date, close in rows:
+        closes[stock_id][0].append(date)
+        closes[stock_id][1].append(float(close))
+
+    metrics = []
+    for stock_id, (dates, values) in closes.items():
+        frame = rolling_metrics(pd.Series(values, index=dates, dtype=float))
+        start = starts[stock_id]
+        for date, row in zip(frame.index, frame.to_dict('records')):
+            if start and date < start:
+                continue
+            metrics.append(StockMetric(
+                stock_id=stock_id, date=date, **{name: clean_float(value) for name, value in row.items()}
+            ))
+
+    # Replace rather than upsert, so days whose close has since gone missing don't keep stale rows.
+    stale = Q()
+    for stock_id, start in starts.items():
+        stale |= Q(stock=stock_id, date__gte=start) if start else Q(stock=stock_id)
+    with transaction.atomic():
+        StockMetric.objects.filter(stale).delete()
+        StockMetric.objects.bulk_create(metrics, batch_size=5000)
+    return len(metrics)
+
+
+def equity_curve(stock_ids, shares, date_from=None, date_to=None):
+    """
+    Columnar daily equity curve of holding ``shares`` of each stock throughout
+    the window: ``{'date', 'value', 'daily_return', 'cumulative_return'}`` lists
+    in ascending date order, built from one close_matrix() load.
+    """
+    values = portfolio_values(close_matrix(stock_ids, date_from, date_to), shares)
+    daily_return = values.pct_change()
+    cumulative_return = values / values.iloc[0] - 1 if len(values) else values
+    return {
+        'date': [timestamp.date() for timestamp in values.index],
+        'value': [clean_float(value) for value in values],
+        'daily_return': [clean_float(value) for value in daily_return],
+        'cumulative_return': [clean_float(value) for value in cumulative_return],
+    }
+
+
+def universe_comoments(date_from=None, date_to=None):
+    """
+    ``(covariance, correlation)`` DataFrames of the daily returns of every pair
+    of stocks in the window, indexed by stock id. Each pair uses only the days
+    both stocks have a return, so every subset is a slice of these matrices.
+    They are computed once per window and price data version, then cached.
+    """
+    key = f'return-comoments:{price_data_version()}:{date_from}:{date_to}'
+    comoments = cache.get(key)
+    if comoments is None:
+        stock_ids = sorted(Stock.objects.values_list('id', flat=True))
+        comoments = return_comoments(close_matrix(stock_ids, date_from, date_to))
+        cache.set(key, comoments, COMOMENTS_CACHE_SECONDS)
+    return comoments
+
+
+def comoment_matrix(stock_ids, statistic='correlation', date_from=None, date_to=None):
+    """
+    The covariance or correlation matrix of the given stocks' daily returns as
+    nested lists in ``stock_ids`` order, None where a pair has fewer than two
+    common returns (or a stock is newer than the cached matrices).
+    """
+    covariance, correlation = universe_comoments(date_from, date_to)
+    matrix = (covariance if statistic == 'covariance' else correlation).reindex(index=stock_ids, columns=stock_ids)
+    return [[clean_float(value) for value in row] for row in matrix.to_numpy()]
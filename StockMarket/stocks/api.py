@@ -8,16 +8,130 @@ from .serializers import (
     PortfolioSerializer, 
     WatchlistSerializer,
     NestedStockSerializer,
-    PortfolioStockSerializer
+    PortfolioStockSerializer,
+    PortfolioSummarySerializer,
+    PortfolioPositionSerializer,
+    StockScreenSerializer,
+    aattach_price_history,
 )
+from .filters import StockScreenFilter
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.decorators import api_view, permission_classes
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import CursorPagination
+from rest_framework.renderers import JSONRenderer
+from rest_framework.views import APIView
+from .renderers import ColumnarBinaryRenderer, EventStreamRenderer
+from .analytics import (
+    VOLATILITY_WINDOWS,
+    close_matrix,
+    comoment_matrix,
+    equity_curve,
+    portfolio_values,
+    risk_rows,
+    stock_risk,
+    window_start,
+)
+from .prices import aattach_reference_prices, valued_holdings
+from .search import get_search_index
+from .caching import (
+    ConditionalGetMixin,
+    acached_user_response,
+    bump_user_data_version,
+    cached_user_response,
+    price_data_version,
+)
+from .streaming import PRICE_STREAM_SECONDS, aprice_deltas, price_stream
+from .async_views import AsyncViewMixin
+from frontend.risk import DEFAULT_WEIGHTS, RISK_FACTORS, risk_metrics
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Max, Prefetch, Q
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+from django.shortcuts import aget_object_or_404, get_object_or_404
+from asgiref.sync import sync_to_async
+import datetime
+import hashlib
+
+def parse_date_param(request, name):
+    """
+    Read an optional YYYY-MM-DD query parameter, answering 400 if it is malformed.
+    """
+    value = request.query_params.get(name)
+    if not value:
+        return None
+    try:
+        return datetime.date.fromisoformat(value)
+    except ValueError:
+        raise ValidationError({name: 'Date must be in YYYY-MM-DD format.'})
+
+
+def parse_date_window(request):
+    """
+    Date bounds from ?from= / ?to= (YYYY-MM-DD) and/or ?days=N for the N days up
+    to the newest stored price. Returns ``(date_from, date_to)``, None when unbounded.
+    """
+    date_from = parse_date_param(request, 'from')
+    date_to = parse_date_param(request, 'to')
+
+    days = request.query_params.get('days')
+    if days:
+        try:
+            days = int(days)
+            if days < 1:
+                raise ValueError
+        except ValueError:
+            raise ValidationError({'days': 'Must be a positive integer.'})
+        latest_date = StockPrice.objects.aggregate(Max('date'))['date__max']
+        if latest_date:
+            start = latest_date - datetime.timedelta(days=days)
+            date_from = max(date_from, start) if date_from else start
+    return date_from, date_to
+
 
-# Read-only endpoint for Stock objects.
-class StockViewSet(viewsets.ReadOnlyModelViewSet):
+def parse_risk_weights(request):
+    """
+    Risk score weights from ?volatility=&sharpe_ratio=&max_drawdown=, defaulting
+    to DEFAULT_WEIGHTS for the ones not given.
+    """
+    weights = dict(DEFAULT_WEIGHTS)
+    for risk_factor in RISK_FACTORS:
+        value = request.query_params.get(risk_factor)
+        if value is None:
+            continue
+        try:
+            weights[risk_factor] = float(value)
+        except ValueError:
+            raise ValidationError({risk_factor: 'Must be a number.'})
+    return weights
+
+
+def parse_risk_window(request):
+    """
+    Optional ?window=N: risk over each stock's last N trading days, one of the
+    rolling windows stored in StockMetric. It replaces ?from=, ?to= and ?days=.
+    """
+    window = request.query_params.get('window')
+    if not window:
+        return None
+    choices = ', '.join(map(str, VOLATILITY_WINDOWS))
+    if not window.isdigit() or int(window) not in VOLATILITY_WINDOWS:
+        raise ValidationError({'window': f'Choose from {choices}.'})
+    if any(request.query_params.get(name) for name in ('from', 'to', 'days')):
+        raise ValidationError({'window': 'Cannot be combined with from, to or days.'})
+    return int(window)
+
+
+# Default and maximum number of /api/stocks/suggest/ results.
+SUGGEST_LIMIT = 10
+SUGGEST_MAX_LIMIT = 50
+
+# Read-only endpoint for Stock objects. List and detail are async views.
+class StockViewSet(AsyncViewMixin, ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
     permission_classes = [permissions.IsAuthenticated]
     queryset = Stock.objects.all()
     serializer_class = StockSerializer
@@ -32,12 +146,201 @@ class StockViewSet(viewsets.ReadOnlyModelViewSet):
             return StockSerializer
         return StockSerializerBasic
 
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.request.query_params.get('with_prices') == 'true':
+            # list and retrieve parse the window up front, off the event loop.
+            context['price_window'] = getattr(self, 'price_window', None) or parse_date_window(self.request)
+        return context
+
+    async def parse_price_window(self):
+        # parse_date_window() may query the newest price date, so run it in a thread.
+        if self.get_serializer_class() is StockSerializer:
+            self.price_window = await sync_to_async(parse_date_window)(self.request)
 
-# Read-only endpoint for StockPrice objects.
-class StockPriceViewSet(viewsets.ReadOnlyModelViewSet):
+    async def load_prices(self, stocks):
+        # Load the prices the serializer shows with the async ORM, so serializing runs no queries.
+        if self.get_serializer_class() is StockSerializer:
+            await aattach_price_history(stocks, *self.price_window)
+        else:
+            await aattach_reference_prices(stocks)
+
+    async def list(self, request, *args, **kwargs):
+        await self.parse_price_window()
+        stocks = [stock async for stock in self.filter_queryset(self.get_queryset())]
+        await self.load_prices(stocks)
+        return Response(self.get_serializer(stocks, many=True).data)
+
+    async def retrieve(self, request, *args, **kwargs):
+        stock = await self.aget_object()
+        await self.parse_price_window()
+        await self.load_prices([stock])
+        return Response(self.get_serializer(stock).data)
+
+    # Risk factors and weighted risk score of every (filtered) stock, read from the
+    # rolling StockMetric rows for ?window=20|60|252 (trading days), otherwise
+    # computed from StockPrice over the date window.
+    # URL: /api/stocks/risk/?volatility=0.5&sharpe_ratio=0.3&max_drawdown=0.2&days=365 (or &window=252)
+    @action(detail=False, methods=['get'])
+    def risk(self, request):
+        stocks = list(self.filter_queryset(self.get_queryset()).values_list('id', 'ticker'))
+        window = parse_risk_window(request)
+        date_from, date_to = (None, None) if window else parse_date_window(request)
+        risk = stock_risk(
+            [stock_id for stock_id, _ in stocks], parse_risk_weights(request), date_from, date_to, window
+        )
+        return Response([
+            {'id': stock_id, 'ticker': ticker, **risk[stock_id]} for stock_id, ticker in stocks
+        ])
+
+    # Typeahead search over tickers and company names, served from an in-memory index.
+    # URL: /api/stocks/suggest/?q=tata&limit=10
+    @action(detail=False, methods=['get'])
+    def suggest(self, request):
+        try:
+            limit = min(int(request.query_params.get('limit', SUGGEST_LIMIT)), SUGGEST_MAX_LIMIT)
+            if limit < 1:
+                raise ValueError
+        except ValueError:
+            raise ValidationError({'limit': 'Must be a positive integer.'})
+        return Response(get_search_index().search(request.query_params.get('q', ''), limit))
+
+    # Screen every stock on its precomputed, indexed snapshot columns.
+    # URL: /api/stocks/screen/?year_return_min=0.2&volatility_max=0.3&industry=Banking&ordering=-year_return
+    @action(detail=False, methods=['get'])
+    def screen(self, request):
+        stocks = self.filter_queryset(self.get_queryset()).filter(snapshot__date__isnull=False).select_related('snapshot')
+        filterset = StockScreenFilter(request.query_params, queryset=stocks, request=request)
+        if not filterset.is_valid():
+            raise ValidationError(filterset.errors)
+        serializer = StockScreenSerializer(filterset.qs, many=True)
+        return Response(serializer.data)
+
+    # Correlation (default) or covariance matrix of the daily returns of the listed
+    # tickers, or of every (filtered) stock when ?tickers= is not given.
+    # URL: /api/stocks/correlation/?tickers=TCS,INFY,WIPRO&statistic=covariance&days=365
+    @action(detail=False, methods=['get'])
+    def correlation(self, request):
+        statistic = request.query_params.get('statistic', 'correlation')
+        if statistic not in ('correlation', 'covariance'):
+            raise ValidationError({'statistic': "Choose from 'correlation' or 'covariance'."})
+
+        stocks = self.filter_queryset(self.get_queryset())
+        tickers = request.query_params.get('tickers')
+        if tickers:
+            tickers = list(dict.fromkeys(ticker.strip().upper() for ticker in tickers.split(',') if ticker.strip()))
+            ids = dict(stocks.filter(ticker__in=tickers).values_list('ticker', 'id'))
+            unknown = [ticker for ticker in tickers if ticker not in ids]
+            if unknown:
+                raise ValidationError({'tickers': f"Unknown tickers: {', '.join(unknown)}."})
+            stocks = [(ids[ticker], ticker) for ticker in tickers]
+        else:
+            stocks = list(stocks.values_list('id', 'ticker'))
+
+        date_from, date_to = parse_date_window(request)
+        stock_ids = [stock_id for stock_id, _ in stocks]
+        return Response({
+            'statistic': statistic,
+            'tickers': [ticker for _, ticker in stocks],
+            'matrix': comoment_matrix(stock_ids, statistic, date_from, date_to),
+        })
+
+
+# Keyset pagination on date within a single stock: every page is an index range
+# scan on (stock, date) whatever its position, with no OFFSET to skip over.
+class StockPriceCursorPagination(CursorPagination):
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+    ordering = '-date'
+
+
+# Column names of the columnar price format and the StockPrice fields they come from.
+PRICE_COLUMNS = {
+    'date': 'date',
+    'open': 'open_price',
+    'high': 'high_price',
+    'low': 'low_price',
+    'close': 'close_price',
+    'prev_close': 'prev_close_price',
+    'last': 'last_price',
+    'vwap': 'VWAP',
+    'volume': 'volume',
+}
+DEFAULT_PRICE_COLUMNS = ['date', 'open', 'high', 'low', 'close', 'volume']
+
+
+# Read-only endpoint for StockPrice objects. List and detail are async views.
+# URL: /api/prices/?ticker=TCS&from=2020-01-01&to=2020-12-31&fields=date,close_price
+class StockPriceViewSet(AsyncViewMixin, ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
     permission_classes = [permissions.IsAuthenticated]
-    queryset = StockPrice.objects.all()
     serializer_class = StockPriceSerializer
+    pagination_class = StockPriceCursorPagination
+
+    def get_queryset(self):
+        queryset = StockPrice.objects.all()
+        if self.action == 'retrieve':
+            return queryset
+
+        # Listing is always scoped to one stock so pages stay on the (stock, date) index.
+        stock = getattr(self, 'stock', None) or get_object_or_404(self.requested_stock())
+        queryset = queryset.filter(stock=stock)
+
+        date_from = parse_date_param(self.request, 'from')
+        date_to = parse_date_param(self.request, 'to')
+        if date_from:
+            queryset = queryset.filter(date__gte=date_from)
+        if date_to:
+            queryset = queryset.filter(date__lte=date_to)
+        return queryset
+
+    def requested_stock(self):
+        # Stock queryset of the required ?ticker= parameter.
+        ticker = self.request.query_params.get('ticker')
+        if not ticker:
+            raise ValidationError({'ticker': 'This query parameter is required.'})
+        return Stock.objects.filter(ticker=ticker.upper())
+
+    async def list(self, request, *args, **kwargs):
+        self.stock = await aget_object_or_404(self.requested_stock())
+        # CursorPagination runs the page query itself, so run it in a thread like the async ORM does.
+        page = await sync_to_async(self.paginate_queryset)(self.filter_queryset(self.get_queryset()))
+        return self.get_paginated_response(self.get_serializer(page, many=True).data)
+
+    async def retrieve(self, request, *args, **kwargs):
+        price = await self.aget_object()
+        return Response(self.get_serializer(price).data)
+
+    def get_serializer(self, *args, **kwargs):
+        # ?fields=date,close_price returns only the listed fields.
+        fields = self.request.query_params.get('fields')
+        if fields:
+            kwargs['fields'] = [field.strip() for field in fields.split(',') if field.strip()]
+        return super().get_serializer(*args, **kwargs)
+
+    # Columnar price history for charts: {"date": [...], "close": [...], ...} in
+    # ascending date order, built straight from values_list columns.
+    # URL: /api/prices/columns/?ticker=TCS&from=2020-01-01&fields=close,volume
+    # Add ?format=bin (or Accept: application/octet-stream) for packed binary arrays.
+    @action(detail=False, methods=['get'], renderer_classes=[JSONRenderer, ColumnarBinaryRenderer])
+    def columns(self, request):
+        requested = request.query_params.get('fields')
+        if requested:
+            names = [name.strip() for name in requested.split(',') if name.strip()]
+        else:
+            names = list(DEFAULT_PRICE_COLUMNS)
+        unknown = [name for name in names if name not in PRICE_COLUMNS]
+        if unknown:
+            raise ValidationError({'fields': f"Unknown columns: {', '.join(unknown)}. Choose from {', '.join(PRICE_COLUMNS)}."})
+        if 'date' not in names:
+            names.insert(0, 'date')
+
+        rows = self.get_queryset().order_by('date').values_list(*(PRICE_COLUMNS[name] for name in names))
+        values = list(zip(*rows)) or [()] * len(names)
+        return Response({name: list(column) for name, column in zip(names, values)})
+
+# Portfolio equity curves are cached per price data version (see stocks.caching).
+EQUITY_CURVE_CACHE_SECONDS = 24 * 60 * 60
 
 # CRUD endpoint for Portfolio objects.
 
@@ -46,10 +349,34 @@ class PortfolioViewSet(viewsets.ModelViewSet):
     serializer_class = PortfolioSerializer
 
     def get_queryset(self):
-        return Portfolio.objects.filter(owner=self.request.user)
+        queryset = Portfolio.objects.filter(owner=self.request.user)
+        if self.action in ('summary', 'positions'):
+            # Load their holdings themselves.
+            return queryset
+        # Holdings, their stocks and latest quotes in one extra query.
+        holdings = PortfolioStock.objects.select_related('stock__snapshot')
+        return queryset.prefetch_related(Prefetch('portfoliostock_set', queryset=holdings))
     
+    # Portfolio reads are served from a per-user cache until prices or the user's data change.
+    def list(self, request, *args, **kwargs):
+        build = super().list
+        return Response(cached_user_response(request, lambda: build(request, *args, **kwargs).data))
+
+    def retrieve(self, request, *args, **kwargs):
+        build = super().retrieve
+        return Response(cached_user_response(request, lambda: build(request, *args, **kwargs).data))
+
     def perform_create(self, serializer):
         serializer.save(owner=self.request.user)
+        bump_user_data_version(self.request.user.pk)
+
+    def perform_update(self, serializer):
+        serializer.save()
+        bump_user_data_version(self.request.user.pk)
+
+    def perform_destroy(self, instance):
+        instance.delete()
+        bump_user_data_version(self.request.user.pk)
 
     # Custom action to add, retrieve, or delete a stock on a portfolio.
     # URL: /api/portfolios/<portfolio_pk>/<stock_param>/
@@ -86,7 +413,9 @@ class PortfolioViewSet(viewsets.ModelViewSet):
                 ps.buy_price = buy_price
                 ps.shares = shares
                 ps.save()
+                bump_user_data_version(request.user.pk)
                 return Response({'detail': 'Stock updated in portfolio.'}, status=status.HTTP_200_OK)
+            bump_user_data_version(request.user.pk)
             return Response({'detail': 'Stock added to portfolio.'}, status=status.HTTP_200_OK)
         
         # For GET and DELETE, treat stock_param as a 1-indexed position within portfolio.portfoliostock_set.
@@ -98,27 +427,178 @@ class PortfolioViewSet(viewsets.ModelViewSet):
         
         if request.method.lower() == 'delete':
             ps.delete()
+            bump_user_data_version(request.user.pk)
             return Response({'detail': 'Stock removed from portfolio.'}, status=status.HTTP_204_NO_CONTENT)
         
         # GET: return the portfolio stock details.
         serializer = PortfolioStockSerializer(ps)
         return Response(serializer.data)
 
+    # Many holdings at once, with stocks given as ids or tickers. All or nothing.
+    # URL: /api/portfolios/<portfolio_pk>/positions/
+    # POST {"positions": [{"stock": "TCS", "buy_price": 10, "shares": 5}, ...]}: add or update these holdings.
+    # PUT  {"positions": [...]}: make these the portfolio's only holdings.
+    # DELETE {"stocks": ["TCS", 7, ...]}: remove these holdings.
+    @action(detail=True, methods=['post', 'put', 'delete'])
+    def positions(self, request, pk=None):
+        portfolio = self.get_object()
+        holdings = portfolio.portfoliostock_set
+        if not isinstance(request.data, dict):
+            raise ValidationError('Expected a JSON object.')
+
+        if request.method == 'DELETE':
+            stock_ids = resolve_stocks(request.data.get('stocks', []), 'stocks')
+            deleted, _ = holdings.filter(stock__in=stock_ids).delete()
+            bump_user_data_version(request.user.pk)
+            return Response({'created': 0, 'updated': 0, 'deleted': deleted}, status=status.HTTP_200_OK)
+
+        if not isinstance(request.data.get('positions'), list):
+            raise ValidationError({'positions': 'Must be a list of positions.'})
+        serializer = PortfolioPositionSerializer(data=request.data['positions'], many=True)
+        serializer.is_valid(raise_exception=True)
+        stock_ids = resolve_stocks([position['stock'] for position in serializer.validated_data], 'positions')
+        if len(set(stock_ids)) != len(stock_ids):
+            raise ValidationError({'positions': 'Each stock may only appear once.'})
+
+        with transaction.atomic():
+            existing = {holding.stock_id: holding for holding in holdings.filter(stock__in=stock_ids)}
+            created, updated = [], []
+            for stock_id, position in zip(stock_ids, serializer.validated_data):
+                holding = existing.get(stock_id)
+                if holding is None:
+                    created.append(PortfolioStock(
+                        portfolio=portfolio, stock_id=stock_id,
+                        buy_price=position['buy_price'], shares=position['shares'],
+                    ))
+                else:
+                    holding.buy_price = position['buy_price']
+                    holding.shares = position['shares']
+                    updated.append(holding)
+            PortfolioStock.objects.bulk_create(created)
+            PortfolioStock.objects.bulk_update(updated, ['buy_price', 'shares'])
+            deleted = 0
+            if request.method == 'PUT':
+                deleted, _ = holdings.exclude(stock__in=stock_ids).delete()
+        bump_user_data_version(request.user.pk)
+        return Response(
+            {'created': len(created), 'updated': len(updated), 'deleted': deleted},
+            status=status.HTTP_200_OK,
+        )
+
+    # Risk factors of each holding and of the portfolio's daily market value. With
+    # ?window=20|60|252 the holdings' figures are read from StockMetric and the
+    # portfolio's cover the same number of trading days.
+    # URL: /api/portfolios/<portfolio_pk>/risk/?volatility=0.5&sharpe_ratio=0.3&max_drawdown=0.2
+    @action(detail=True, methods=['get'])
+    def risk(self, request, pk=None):
+        portfolio = self.get_object()
+        holdings = list(portfolio.portfoliostock_set.all())
+        weights = parse_risk_weights(request)
+        window = parse_risk_window(request)
+        stock_ids = [holding.stock_id for holding in holdings]
+        shares = [holding.shares for holding in holdings]
+
+        if window:
+            risk = stock_risk(stock_ids, weights, window=window)
+            values = portfolio_values(close_matrix(stock_ids, window_start(stock_ids, window)), shares)
+            values = values.iloc[-(window + 1):]
+        else:
+            date_from, date_to = parse_date_window(request)
+            closes = close_matrix(stock_ids, date_from, date_to)
+            risk = risk_rows(risk_metrics(closes), weights)
+            values = portfolio_values(closes, shares)
+        total = risk_rows(risk_metrics(values.to_frame('portfolio')), weights)['portfolio']
+
+        return Response({
+            'id': portfolio.id,
+            'name': portfolio.name,
+            **total,
+            'stocks': [
+                {'id': holding.stock_id, 'ticker': holding.stock.ticker, **risk[holding.stock_id]}
+                for holding in holdings
+            ],
+        })
+
+    # Daily market value of the current holdings over time, with daily and cumulative returns,
+    # as columns like /api/prices/columns/. Cached until the next price import.
+    # URL: /api/portfolios/<portfolio_pk>/equity/?from=2020-06-01&to=2021-04-30 (or ?days=365)
+    # Add ?format=bin (or Accept: application/octet-stream) for packed binary arrays.
+    @action(detail=True, methods=['get'], renderer_classes=[JSONRenderer, ColumnarBinaryRenderer])
+    def equity(self, request, pk=None):
+        portfolio = self.get_object()
+        holdings = sorted(portfolio.portfoliostock_set.all(), key=lambda holding: holding.stock_id)
+        date_from, date_to = parse_date_window(request)
+
+        # Changing the holdings or importing prices (even rewriting old ones) starts a new cache entry.
+        positions = ','.join(f'{holding.stock_id}:{holding.shares}' for holding in holdings)
+        key = 'portfolio-equity:{}:{}:{}:{}:{}'.format(
+            portfolio.pk, price_data_version(), date_from, date_to, hashlib.sha1(positions.encode()).hexdigest()
+        )
+        curve = cache.get(key)
+        if curve is None:
+            curve = equity_curve(
+                [holding.stock_id for holding in holdings],
+                [holding.shares for holding in holdings],
+                date_from, date_to,
+            )
+            cache.set(key, curve, EQUITY_CURVE_CACHE_SECONDS)
+        return Response(curve)
+
+    # Market value, cost basis, unrealised P&L and weight of every holding, plus totals.
+    # URL: /api/portfolios/<portfolio_pk>/summary/
+    @action(detail=True, methods=['get'])
+    def summary(self, request, pk=None):
+        portfolio = self.get_object()
+        holdings = list(valued_holdings(portfolio.pk))
+
+        # Holdings without a close price are left out of the valued totals, so
+        # market_value - cost_basis == unrealised_pnl; their cost is reported apart.
+        valued = [holding for holding in holdings if holding['market_value'] is not None]
+        market_value = sum(holding['market_value'] for holding in valued)
+        for holding in holdings:
+            holding['weight'] = (
+                float(holding['market_value'] / market_value)
+                if holding['market_value'] is not None and market_value else None
+            )
+
+        serializer = PortfolioSummarySerializer({
+            'id': portfolio.id,
+            'name': portfolio.name,
+            'market_value': market_value,
+            'cost_basis': sum(holding['cost_basis'] for holding in valued),
+            'unrealised_pnl': sum(holding['unrealised_pnl'] for holding in valued),
+            'unvalued_cost_basis': sum(
+                holding['cost_basis'] for holding in holdings if holding['market_value'] is None
+            ),
+            'stocks': holdings,
+        })
+        return Response(serializer.data)
+
 # CRUD endpoint for Watchlist objects.
-@api_view(['GET'])
-@permission_classes([IsAuthenticated])
-def get_watchlist(request):
+class WatchlistView(AsyncViewMixin, ConditionalGetMixin, APIView):
     """
     GET /api/watchlist/
     Returns the authenticated user's watchlist (stocks list).
     """
-    try:
-        watchlist = Watchlist.objects.get(owner=request.user)
-    except Watchlist.DoesNotExist:
-        # If the user does not have a watchlist, return an empty list.
-        return Response({"stocks": []}, status=status.HTTP_200_OK)
-    serializer = WatchlistSerializer(watchlist)
-    return Response(serializer.data, status=status.HTTP_200_OK)
+    permission_classes = [IsAuthenticated]
+    user_specific_etag = True
+
+    async def get(self, request):
+        async def build():
+            try:
+                watchlist = await Watchlist.objects.prefetch_related('stocks').aget(owner=request.user)
+            except Watchlist.DoesNotExist:
+                # If the user does not have a watchlist, return an empty list.
+                return {"stocks": []}
+            await aattach_reference_prices(watchlist.stocks.all())
+            serializer = WatchlistSerializer(watchlist)
+            return serializer.data
+
+        # Served from a per-user cache until prices or the user's data change;
+        # ConditionalGetMixin answers 304 if the client's copy is still current.
+        return Response(await acached_user_response(request, build), status=status.HTTP_200_OK)
+
+get_watchlist = WatchlistView.as_view()
 
 @api_view(['POST', 'DELETE'])
 @permission_classes([IsAuthenticated])
@@ -136,7 +616,108 @@ def change_watchlist(request, stock_id):
     
     if request.method == 'POST':
         watchlist.stocks.add(stock)
-        return Response({"message": "Stock added to watchlist"}, status=status.HTTP_200_OK)
+        message = "Stock added to watchlist"
     else:  # DELETE
         watchlist.stocks.remove(stock)
-        return Response({"message": "Stock removed from watchlist"}, status=status.HTTP_200_OK)
\ No newline at end of file
+        message = "Stock removed from watchlist"
+    bump_user_data_version(request.user.pk)
+    return Response({"message": message}, status=status.HTTP_200_OK)
+
+
+def resolve_stocks(items, name):
+    """
+    Turn a list of stock ids and/or tickers into the matching stock ids, in
+    order, with one IN query, answering 400 if the list is malformed or
+    anything is unknown.
+    """
+    if not isinstance(items, list):
+        raise ValidationError({name: 'Must be a list of stock ids or tickers.'})
+    keys = []
+    for item in items:
+        if isinstance(item, int) and not isinstance(item, bool):
+            keys.append(('id', item))
+        elif isinstance(item, str) and item.strip().isdigit():
+            keys.append(('id', int(item)))
+        elif isinstance(item, str) and item.strip():
+            keys.append(('ticker', item.strip().upper()))
+        else:
+            raise ValidationError({name: f'Invalid stock id or ticker: {item!r}.'})
+    if not keys:
+        return []
+
+    ids = [value for kind, value in keys if kind == 'id']
+    tickers = [value for kind, value in keys if kind == 'ticker']
+    found = {}
+    for stock_id, ticker in Stock.objects.filter(Q(id__in=ids) | Q(ticker__in=tickers)).values_list('id', 'ticker'):
+        found[('id', stock_id)] = found[('ticker', ticker)] = stock_id
+
+    unknown = [str(value) for kind, value in keys if (kind, value) not in found]
+    if unknown:
+        raise ValidationError({name: f"Unknown stocks: {', '.join(unknown)}."})
+    return [found[key] for key in keys]
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def bulk_change_watchlist(request):
+    """
+    POST /api/watchlist/bulk/ with {"add": [...], "remove": [...]} → Adds and
+    removes many stocks, given as ids or tickers, in one transaction.
+    """
+    if not isinstance(request.data, dict):
+        raise ValidationError('Expected a JSON object.')
+    add = set(resolve_stocks(request.data.get('add', []), 'add'))
+    remove = set(resolve_stocks(request.data.get('remove', []), 'remove'))
+    if add & remove:
+        return Response({"error": "A stock cannot be both added and removed."}, status=status.HTTP_400_BAD_REQUEST)
+
+    Membership = Watchlist.stocks.through
+    with transaction.atomic():
+        watchlist, created = Watchlist.objects.get_or_create(owner=request.user)
+        existing = set() if created else set(
+            Membership.objects.filter(watchlist=watchlist, stock__in=add | remove).values_list('stock_id', flat=True)
+        )
+        added = sorted(add - existing)
+        removed = sorted(remove & existing)
+        if added:
+            # A concurrent request may have added some of these since the read above.
+            Membership.objects.bulk_create(
+                [Membership(watchlist=watchlist, stock_id=stock_id) for stock_id in added],
+                ignore_conflicts=True,
+            )
+        if removed:
+            Membership.objects.filter(watchlist=watchlist, stock__in=removed).delete()
+    bump_user_data_version(request.user.pk)
+    return Response(
+        {"message": "Watchlist updated", "added": added, "removed": removed},
+        status=status.HTTP_200_OK,
+    )
+
+
+# Server-Sent Events with the latest quotes of the user's watchlist and portfolio
+# stocks (or of ?stocks=, ids or tickers), pushed whenever new prices are imported.
+# URL: /api/stream/prices/?stocks=TCS,INFY
+class PriceStreamView(AsyncViewMixin, APIView):
+    permission_classes = [IsAuthenticated]
+    renderer_classes = [EventStreamRenderer, JSONRenderer]
+
+    async def get(self, request):
+        requested = request.query_params.get('stocks')
+        if requested:
+            stock_ids = set(await sync_to_async(resolve_stocks)(requested.split(','), 'stocks'))
+        else:
+            owned = Stock.objects.filter(Q(watchlists__owner=request.user) | Q(portfolios__owner=request.user))
+            stock_ids = {stock_id async for stock_id in owned.values_list('id', flat=True)}
+
+        # Read the version first, so prices imported meanwhile are still pushed.
+        version = await sync_to_async(price_data_version)()
+        deltas = await aprice_deltas(stock_ids)
+        # WSGI servers buffer the whole stream, so they only send the snapshot
+        # and clients reconnect to poll.
+        seconds = PRICE_STREAM_SECONDS if isinstance(request._request, ASGIRequest) else 0
+        response = StreamingHttpResponse(
+            price_stream(stock_ids, deltas, version, seconds), content_type='text/event-stream'
+        )
+        response['Cache-Control'] = 'no-cache'
+        # Stop nginx from buffering the stream.
+        response['X-Accel-Buffering'] = 'no'
+        return response
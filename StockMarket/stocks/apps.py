@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class StocksConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "stocks"
+
+    def ready(self):
+        # Connect the receivers that keep derived tables in sync with imports.
+        from stocks import signals  # noqa: F401
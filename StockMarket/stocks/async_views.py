@@ -0,0 +1,63 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.core.exceptions import ValidationError
+from django.http import Http404
+from django.shortcuts import aget_object_or_404
+from django.utils.decorators import classonlymethod
+
+
+class AsyncViewMixin:
+    """
+    Lets a DRF APIView or ViewSet define ``async def`` handlers and actions,
+    which read the database with Django's async ORM. Under ASGI the view is a
+    coroutine, so a worker keeps serving other requests while one waits on
+    the database; under WSGI Django runs it in an event loop of its own.
+
+    Authentication, permission and throttle checks and the remaining
+    synchronous handlers may query the database, so they run in a thread.
+    """
+
+    @classonlymethod
+    def as_view(cls, *args, **kwargs):
+        # ViewSets build their own view function, which Django can't tell is async.
+        return markcoroutinefunction(super().as_view(*args, **kwargs))
+
+    async def dispatch(self, request, *args, **kwargs):
+        # Same steps as APIView.dispatch.
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+
+            if iscoroutinefunction(handler):
+                response = await handler(request, *args, **kwargs)
+            else:
+                response = await sync_to_async(handler)(request, *args, **kwargs)
+
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+    async def aget_object(self):
+        """
+        Async version of GenericAPIView.get_object().
+        """
+        queryset = self.filter_queryset(self.get_queryset())
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            obj = await aget_object_or_404(queryset, **{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        except (TypeError, ValueError, ValidationError):
+            # A lookup value of the wrong type, e.g. /api/stocks/abc/.
+            raise Http404
+        self.check_object_permissions(self.request, obj)
+        return obj
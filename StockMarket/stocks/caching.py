@@ -0,0 +1,148 @@
+import hashlib
+import time
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+# Cached data built from the database (user responses here, equity curves and
+# return matrices elsewhere) is keyed by the data versions below, which every
+# write to that data bumps. Entries never go stale and only expire to free space.
+USER_RESPONSE_CACHE_SECONDS = 60 * 60
+
+PRICE_DATA_VERSION_KEY = 'price-data-version'
+USER_DATA_VERSION_KEY = 'user-data-version:{}'
+
+
+def get_version(key):
+    # A missing version (first use, or culled from the cache) starts a new one,
+    # which can only turn old entries into misses.
+    version = cache.get(key)
+    if version is None:
+        version = bump_version(key)
+    return version
+
+
+def bump_version(key):
+    version = str(time.time_ns())
+    cache.set(key, version, None)
+    return version
+
+
+def price_data_version():
+    """
+    Version of the stored stocks, prices and the snapshots and metrics derived
+    from them, bumped whenever an import, a refresh command or a Stock save
+    changes any of them.
+    """
+    return get_version(PRICE_DATA_VERSION_KEY)
+
+
+def bump_price_data_version():
+    return bump_version(PRICE_DATA_VERSION_KEY)
+
+
+def user_data_version(user_id):
+    """
+    Version of a user's watchlist and portfolios, bumped whenever they change.
+    """
+    return get_version(USER_DATA_VERSION_KEY.format(user_id))
+
+
+def bump_user_data_version(user_id):
+    return bump_version(USER_DATA_VERSION_KEY.format(user_id))
+
+
+def user_response_key(request):
+    user_id = request.user.pk
+    return 'user-response:{}:{}:{}:{}'.format(
+        user_id, price_data_version(), user_data_version(user_id), request.get_full_path()
+    )
+
+
+def cached_user_response(request, build):
+    """
+    Return the response data of ``build()`` for this user and URL, computed at
+    most once per price data version and user data version.
+    """
+    key = user_response_key(request)
+    data = cache.get(key)
+    if data is None:
+        data = build()
+        cache.set(key, data, USER_RESPONSE_CACHE_SECONDS)
+    return data
+
+
+async def acached_user_response(request, build):
+    """
+    Async version of :func:`cached_user_response`, for a coroutine function ``build``.
+    """
+    key = await sync_to_async(user_response_key)(request)
+    data = await cache.aget(key)
+    if data is None:
+        data = await build()
+        await cache.aset(key, data, USER_RESPONSE_CACHE_SECONDS)
+    return data
+
+
+def conditional_validators(request, user_specific=False):
+    """
+    ``(etag, last_modified)`` of a GET response built from the stored prices
+    (and, if ``user_specific``, the user's watchlist and portfolios). Both only
+    change when one of the data versions is bumped.
+    """
+    versions = [price_data_version()]
+    if user_specific:
+        versions.append(user_data_version(request.user.pk))
+    renderer = getattr(request, 'accepted_renderer', None)
+    parts = [*versions, request.get_full_path(), getattr(renderer, 'format', '')]
+    if user_specific:
+        parts.append(request.user.pk)
+    etag = quote_etag(hashlib.sha1(':'.join(map(str, parts)).encode()).hexdigest())
+    # Versions are the time they were bumped, in nanoseconds.
+    last_modified = max(int(version) for version in versions) // 10 ** 9
+    return etag, last_modified
+
+
+def set_conditional_headers(response, etag, last_modified):
+    if response.status_code in (200, 304):
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        # Browsers revalidate on every use; shared caches don't store per-user data.
+        response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+class NotModified(Exception):
+    def __init__(self, response):
+        self.response = response
+
+
+class ConditionalGetMixin:
+    """
+    Answers GET/HEAD requests whose If-None-Match / If-Modified-Since still
+    match with 304, right after authentication and before the handler runs,
+    and adds ETag and Last-Modified headers to full responses.
+    """
+    user_specific_etag = False
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self.conditional = None
+        if request.method in ('GET', 'HEAD'):
+            self.conditional = conditional_validators(request, self.user_specific_etag)
+            etag, last_modified = self.conditional
+            response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if response is not None:
+                raise NotModified(response)
+
+    def handle_exception(self, exc):
+        if isinstance(exc, NotModified):
+            return exc.response
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if getattr(self, 'conditional', None):
+            set_conditional_headers(response, *self.conditional)
+        return response
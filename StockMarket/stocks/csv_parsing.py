@@ -0,0 +1,150 @@
+"""
+Parsing of the NSE price CSV files used by the ``import_all_csv`` command.
+
+Nothing in here touches the ORM, so :func:`iter_price_chunks` and
+:func:`parse_price_file_into` can run inside worker processes of a process
+pool without setting Django up first.
+"""
+import csv
+import hashlib
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+# Maps StockPrice fields to the CSV columns they are read from.
+PRICE_COLUMNS = {
+    'prev_close_price': 'Prev Close',
+    'open_price': 'Open',
+    'high_price': 'High',
+    'last_price': 'Last',
+    'low_price': 'Low',
+    'close_price': 'Close',
+    'VWAP': 'VWAP',
+    'volume': 'Volume',
+}
+
+PRICE_FIELDS = list(PRICE_COLUMNS)
+
+
+def to_decimal(val):
+    if val is None:
+        return None
+    val = val.strip()
+    if val == '':
+        return None
+    return Decimal(val.replace(',', ''))  # remove commas if any
+
+
+def parse_date(date_str):
+    return datetime.strptime(date_str, '%Y-%m-%d').date()
+
+
+def file_hash(csv_file):
+    """
+    Return the SHA-256 hex digest of a CSV file, read in 1 MiB blocks.
+    """
+    digest = hashlib.sha256()
+    with open(csv_file, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def find_max_date(csv_file):
+    """
+    Return the latest valid date in a price CSV file. This is a cheap first
+    pass that only looks at the Date column and keeps nothing else in memory.
+    """
+    max_date = None
+    with open(csv_file, 'r', encoding='utf-8', newline='') as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if not header or 'Date' not in header:
+            return None
+        date_index = header.index('Date')
+        for row in reader:
+            if len(row) <= date_index:
+                continue
+            try:
+                d = parse_date(row[date_index].strip())
+            except ValueError:
+                # skip invalid dates while finding max_date
+                continue
+            if (max_date is None) or (d > max_date):
+                max_date = d
+    return max_date
+
+
+def iter_price_chunks(csv_file, ticker_from_filename, since=None, chunk_size=5000):
+    """
+    Stream one price CSV file, keeping only rows on or after January 1 of the
+    year before the file's latest date. When ``since`` is given, rows dated on
+    or before it are skipped as already imported.
+
+    Yields ``(rows, warnings)`` with at most ``chunk_size`` rows, each a tuple
+    of ``(ticker, date, *values)`` with values ordered like ``PRICE_FIELDS``,
+    so memory use does not grow with the size of the file.
+    """
+    # Calculate threshold: If max_date exists then keep data with date
+    # on or after January 1 of (max_date.year - 1)
+    max_date = find_max_date(csv_file)
+    threshold_date = None
+    if max_date:
+        threshold_date = datetime(max_date.year - 1, 1, 1).date()
+
+    rows = []
+    warnings = []
+    with open(csv_file, 'r', encoding='utf-8', newline='') as f:
+        for row in csv.DictReader(f):
+            # Map CSV columns to Stock model fields.
+            ticker = row.get('Symbol', '').strip() or ticker_from_filename
+
+            # Parse the Date column (assumes format 'YYYY-MM-DD').
+            date_str = row.get('Date', '').strip()
+            try:
+                date = parse_date(date_str)
+            except ValueError:
+                warnings.append(f"Skipping row with invalid date: {date_str} in file {csv_file}")
+                continue
+
+            # Skip rows older than the calculated threshold for this CSV (if threshold was determined).
+            if threshold_date and date < threshold_date:
+                continue
+            if since and date <= since:
+                continue
+
+            # Map CSV columns to the StockPrice model fields.
+            values = []
+            for column in PRICE_COLUMNS.values():
+                try:
+                    values.append(to_decimal(row.get(column)))
+                except InvalidOperation:
+                    warnings.append(f"Invalid decimal value: {row.get(column)} in file {csv_file} on date {date_str}")
+                    values.append(None)
+            if values[-1] is not None:
+                values[-1] = int(values[-1])  # volume
+
+            rows.append((ticker, date, *values))
+            if len(rows) >= chunk_size:
+                yield rows, warnings
+                rows, warnings = [], []
+
+    if rows or warnings:
+        yield rows, warnings
+
+
+def parse_price_file_into(queue, csv_file, ticker_from_filename, since=None, chunk_size=5000):
+    """
+    Process pool entry point: stream the chunks of one price file into
+    ``queue`` as ``(csv_file, 'rows', (rows, warnings))`` messages, followed by
+    ``(csv_file, 'done', None)`` or ``(csv_file, 'error', message)``.
+
+    A bounded queue makes workers wait for the writer instead of piling up
+    parsed rows in memory.
+    """
+    try:
+        for chunk in iter_price_chunks(csv_file, ticker_from_filename, since, chunk_size):
+            queue.put((csv_file, 'rows', chunk))
+    except Exception as e:
+        queue.put((csv_file, 'error', str(e)))
+    else:
+        queue.put((csv_file, 'done', None))
@@ -0,0 +1,36 @@
+import django_filters
+from stocks.models import Stock
+
+# StockSnapshot columns the screener filters and sorts on.
+SCREENER_FIELDS = [
+    'week_return',
+    'month_return',
+    'year_return',
+    'volatility',
+    'volume',
+    'distance_from_high',
+    'vwap_deviation',
+]
+
+
+class StockScreenFilter(django_filters.FilterSet):
+    """
+    ``?<field>_min=`` / ``?<field>_max=`` bounds and ``?ordering=[-]<field>`` over
+    the precomputed screener columns of each stock's StockSnapshot,
+    e.g. ``?year_return_min=0.2&volatility_max=0.3&ordering=-year_return``.
+    """
+    ordering = django_filters.OrderingFilter(
+        fields=[(f'snapshot__{name}', name) for name in SCREENER_FIELDS] + [('ticker', 'ticker')],
+    )
+
+    class Meta:
+        model = Stock
+        fields = []
+
+    @classmethod
+    def get_filters(cls):
+        filters = super().get_filters()
+        for name in SCREENER_FIELDS:
+            filters[f'{name}_min'] = django_filters.NumberFilter(field_name=f'snapshot__{name}', lookup_expr='gte')
+            filters[f'{name}_max'] = django_filters.NumberFilter(field_name=f'snapshot__{name}', lookup_expr='lte')
+        return filters
@@ -1,10 +1,18 @@
 import os
 import csv
 import glob
-from datetime import datetime, timedelta
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from queue import Empty
 from django.core.management.base import BaseCommand, CommandError
-from stocks.models import Stock, StockPrice
-from decimal import Decimal, InvalidOperation
+from django.db import transaction
+from stocks.models import Stock, StockPrice, ImportWatermark
+from stocks.csv_parsing import PRICE_FIELDS, file_hash, iter_price_chunks, parse_price_file_into
+from stocks.signals import prices_imported
+
+DEFAULT_BATCH_SIZE = 5000
+
 
 class Command(BaseCommand):
     help = 'Import stock and historical price data from all CSV files in a given dataset folder, limiting to the last two calendar years in each CSV file'
@@ -15,13 +23,39 @@ class Command(BaseCommand):
             type=str,
             help='Path to the folder containing CSV files'
         )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help='Number of price rows parsed and written per upsert/transaction (default: %(default)s)'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Number of processes parsing CSV files in parallel; the database is always '
+                 'written from the main process (default: %(default)s)'
+        )
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Ignore import watermarks and re-import every file in full, e.g. after '
+                 'historical rows were corrected in place'
+        )
 
     def handle(self, *args, **options):
         dataset_path = options['dataset_path']
+        batch_size = options['batch_size']
+        workers = options['workers']
+        full = options['full']
 
         if not os.path.isdir(dataset_path):
             raise CommandError(f"Directory '{dataset_path}' does not exist or is not a directory.")
-        
+        if batch_size < 1:
+            raise CommandError("--batch-size must be a positive integer.")
+        if workers < 1:
+            raise CommandError("--workers must be a positive integer.")
+
         # Reading metadata from stock_metadata.csv
         metadata_file = os.path.join(dataset_path, 'stock_metadata.csv')
         try:
@@ -38,117 +72,240 @@ class Command(BaseCommand):
                         ticker=ticker,
                         defaults={'company_name': company_name, 'series': series, 'industry': industry}
                     )
-                    if not created:
+                    # Only save real changes: every save invalidates cached responses.
+                    if not created and (stock_obj.company_name, stock_obj.series) != (company_name, series):
                         stock_obj.company_name = company_name
                         stock_obj.series = series
-                        stock_obj.save()
+                        stock_obj.save(update_fields=['company_name', 'series'])
         except FileNotFoundError:
             self.stdout.write(self.style.WARNING(f"Metadata file '{metadata_file}' not found. Skipping metadata import."))
 
-        # Find all CSV files in the directory.
+        # Find all CSV files in the directory, using the file name (without extension)
+        # as the default ticker if Symbol is not provided.
         csv_files = glob.glob(os.path.join(dataset_path, '*.csv'))
         if not csv_files:
             self.stdout.write(self.style.WARNING("No CSV files found in the provided dataset directory."))
             return
+        price_files = [
+            (csv_file, os.path.splitext(os.path.basename(csv_file))[0].upper())
+            for csv_file in csv_files
+        ]
+        price_files = [(path, ticker) for path, ticker in price_files if ticker != 'STOCK_METADATA']
 
-        total_records = 0
+        # Resolve every ticker to its primary key once, instead of once per CSV row.
+        stock_ids = dict(Stock.objects.values_list('ticker', 'id'))
+
+        # Skip files that have not changed since the last import and only load
+        # rows newer than the stored watermark from the ones that have.
+        watermarks = {} if full else {w.source_file: w for w in ImportWatermark.objects.all()}
+        tasks = []
+        fingerprints = {}
+        skipped = 0
+        for csv_file, ticker in price_files:
+            fingerprint = self.fingerprint(csv_file, watermarks.get(os.path.basename(csv_file)))
+            if fingerprint is None:
+                skipped += 1
+                continue
+            fingerprints[csv_file] = fingerprint
+            tasks.append((csv_file, ticker, fingerprint['since']))
+        if skipped:
+            self.stdout.write(f"Skipping {skipped} unchanged files.")
 
-        # Process each CSV file.
-        for csv_file in csv_files:
-            self.stdout.write(self.style.SUCCESS(f"Processing file: {csv_file}"))
+        total_records = 0
+        started = time.perf_counter()
+        # Per-file progress, filled in as chunks arrive from the parser(s).
+        progress = {}
+        # Stocks that received rows and the earliest date written for each,
+        # for refreshing derived data afterwards.
+        touched = {}
+        # Files imported in full, whose watermarks are saved at the end.
+        finished = []
 
-            # Use the file name (without extension) as the default ticker if Symbol is not provided.
-            ticker_from_filename = os.path.splitext(os.path.basename(csv_file))[0].upper()
-            if ticker_from_filename == 'STOCK_METADATA':
+        for csv_file, kind, payload in self.parse_files(tasks, workers, batch_size):
+            state = progress.get(csv_file)
+            if state is None:
+                self.stdout.write(self.style.SUCCESS(f"Processing file: {csv_file}"))
+                state = progress[csv_file] = {
+                    'records': 0, 'stock_id': None, 'last_date': None, 'unknown_tickers': set(),
+                    'started': time.perf_counter(), 'failed': False,
+                }
+            if state['failed']:
                 continue
 
-            try:
-                with open(csv_file, 'r', encoding='utf-8') as f:
-                    reader = csv.DictReader(f)
-                    rows = list(reader)
-
-                    # Determine the maximum date available in this CSV file.
-                    max_date = None
-                    for row in rows:
-                        date_str = row.get('Date', '').strip()
-                        try:
-                            d = datetime.strptime(date_str, '%Y-%m-%d').date()
-                            if (max_date is None) or (d > max_date):
-                                max_date = d
-                        except ValueError:
-                            # skip invalid dates while finding max_date
-                            continue
-
-                    # Calculate threshold: If max_date exists then keep data with date 
-                    # on or after January 1 of (max_date.year - 1)
-                    threshold_date = None
-                    if max_date:
-                        threshold_date = datetime(max_date.year - 1, 1, 1).date()
-
-                    for row in rows:
-                        # Map CSV columns to Stock model fields.
-                        ticker = row.get('Symbol', '').strip() or ticker_from_filename
-
-                        # Get the corresponding Stock object (assumes it already exists)
-                        stock_obj = Stock.objects.get(ticker=ticker)
-
-                        # Parse the Date column (assumes format 'YYYY-MM-DD').
-                        date_str = row.get('Date', '').strip()
-                        try:
-                            date = datetime.strptime(date_str, '%Y-%m-%d').date()
-                        except ValueError:
-                            self.stdout.write(
-                                self.style.WARNING(f"Skipping row with invalid date: {date_str} in file {csv_file}")
-                            )
-                            continue
-
-                        # Skip rows older than the calculated threshold for this CSV (if threshold was determined).
-                        if threshold_date and date < threshold_date:
-                            continue
-
-                        def to_decimal(val):
-                            if val is None:
-                                return None
-                            val = val.strip()
-                            if val == '':
-                                return None
-                            try:
-                                return Decimal(val.replace(',', ''))  # remove commas if any
-                            except InvalidOperation:
-                                print(f"Invalid decimal value: {val} in file {csv_file} on date {date_str}")
-                                return None
-
-                        try:
-                            # Map CSV columns to the StockPrice model fields.
-                            stock_price_data = {
-                                'prev_close_price': to_decimal(row.get('Prev Close')),
-                                'open_price': to_decimal(row.get('Open')),
-                                'high_price': to_decimal(row.get('High')),
-                                'last_price': to_decimal(row.get('Last')),
-                                'low_price': to_decimal(row.get('Low')),
-                                'close_price': to_decimal(row.get('Close')),
-                                'VWAP': to_decimal(row.get('VWAP')),
-                                'volume': to_decimal(row.get('Volume')),
-                            }
-                        except Exception as e:
-                            self.stdout.write(
-                                self.style.WARNING(f"Error converting numeric values on {date_str} in file {csv_file}: {e}")
-                            )
-                            continue
-
-                        # Create or update the StockPrice record.
-                        StockPrice.objects.update_or_create(
-                            stock=stock_obj,
-                            date=date,
-                            defaults=stock_price_data
-                        )
-                        total_records += 1
-
-            except Exception as e:
-                self.stdout.write(self.style.WARNING(f"Error processing file {csv_file}: {e}"))
-                # Optionally print detailed error info.
-                print(f"❌ Error in row: {row}")
+            if kind == 'rows':
+                rows, warnings = payload
+                for warning in warnings:
+                    self.stdout.write(self.style.WARNING(warning))
+                try:
+                    records = self.write_rows(csv_file, rows, stock_ids, state, touched)
+                except Exception as e:
+                    self.stdout.write(self.style.WARNING(f"Error processing file {csv_file}: {e}"))
+                    state['failed'] = True
+                    continue
+                state['records'] += records
+                total_records += records
+            elif kind == 'error':
+                self.stdout.write(self.style.WARNING(f"Error processing file {csv_file}: {payload}"))
+            else:
+                records = state['records']
+                self.stdout.write(f"  {records} records ({self.rate(records, state['started'])} rows/sec)")
+                finished.append((csv_file, state))
+
+        if touched:
+            # Let derived tables (e.g. StockSnapshot) catch up with the new rows.
+            prices_imported.send(sender=StockPrice, stock_ids=set(touched), first_dates=touched)
+
+        # Only now mark the files as imported: if a receiver above failed, the next
+        # run loads the same rows again (as upserts) and sends the signal again.
+        for csv_file, state in finished:
+            self.save_watermark(csv_file, state, fingerprints[csv_file])
 
         self.stdout.write(self.style.SUCCESS(
-            f"Successfully processed {len(csv_files)} files and imported {total_records} records."
-        ))
\ No newline at end of file
+            f"Successfully processed {len(csv_files)} files and imported {total_records} records "
+            f"in {time.perf_counter() - started:.1f}s ({self.rate(total_records, started)} rows/sec)."
+        ))
+
+    @staticmethod
+    def rate(records, started):
+        elapsed = time.perf_counter() - started
+        return int(records / elapsed) if elapsed > 0 else records
+
+    def fingerprint(self, csv_file, watermark):
+        """
+        Compare a CSV file with its import watermark. Returns None when the file is
+        unchanged, otherwise a dict with its size, mtime, hash and the date after
+        which rows still need importing (``since``).
+        """
+        stat = os.stat(csv_file)
+        fingerprint = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'hash': None, 'since': None}
+        if watermark is None:
+            return fingerprint
+
+        if (stat.st_size, stat.st_mtime_ns) == (watermark.file_size, watermark.file_mtime_ns):
+            return None
+        fingerprint['hash'] = file_hash(csv_file)
+        if fingerprint['hash'] == watermark.file_hash:
+            # Touched but not modified: remember the new mtime so the next run skips it on stat alone.
+            watermark.file_mtime_ns = stat.st_mtime_ns
+            watermark.save(update_fields=['file_mtime_ns', 'updated_at'])
+            return None
+
+        fingerprint['stock_id'] = watermark.stock_id
+        fingerprint['since'] = watermark.last_date
+        return fingerprint
+
+    def save_watermark(self, csv_file, state, fingerprint):
+        """
+        Record the latest price date imported from a CSV file, the stock it was
+        imported into and the file's size/mtime/hash.
+        """
+        stock_id = fingerprint.get('stock_id') or state['stock_id']
+        if stock_id is None:
+            return
+
+        # Rows on or before the previous watermark were skipped, not missing.
+        dates = [date for date in (state['last_date'], fingerprint['since']) if date is not None]
+        ImportWatermark.objects.update_or_create(
+            source_file=os.path.basename(csv_file),
+            defaults={
+                'stock_id': stock_id,
+                'last_date': max(dates, default=None),
+                'file_size': fingerprint['size'],
+                'file_mtime_ns': fingerprint['mtime_ns'],
+                'file_hash': fingerprint['hash'] or file_hash(csv_file),
+            },
+        )
+
+    def parse_files(self, tasks, workers, chunk_size):
+        """
+        Stream ``(csv_file, kind, payload)`` events for every
+        ``(csv_file, ticker, since)`` task: ``'rows'`` carries a
+        ``(rows, warnings)`` chunk, followed by one ``'done'`` or ``'error'``.
+
+        With more than one worker, files are parsed in a process pool that feeds
+        a bounded queue, so parsers never run far ahead of the single writer.
+        """
+        if workers == 1:
+            for csv_file, ticker, since in tasks:
+                try:
+                    for chunk in iter_price_chunks(csv_file, ticker, since, chunk_size):
+                        yield csv_file, 'rows', chunk
+                except Exception as e:
+                    yield csv_file, 'error', str(e)
+                else:
+                    yield csv_file, 'done', None
+            return
+
+        # The manager is shut down first on the way out, so workers blocked on a
+        # full queue fail fast instead of keeping the executor from exiting.
+        with ProcessPoolExecutor(max_workers=workers) as executor, multiprocessing.Manager() as manager:
+            queue = manager.Queue(maxsize=workers * 2)
+            futures = {
+                executor.submit(parse_price_file_into, queue, csv_file, ticker, since, chunk_size): csv_file
+                for csv_file, ticker, since in tasks
+            }
+            pending = set(futures.values())
+            while pending:
+                try:
+                    csv_file, kind, payload = queue.get(timeout=1)
+                except Empty:
+                    # A worker that died without reporting back would otherwise hang the import.
+                    for future, csv_file in futures.items():
+                        if csv_file in pending and future.done() and future.exception():
+                            pending.discard(csv_file)
+                            yield csv_file, 'error', str(future.exception())
+                    continue
+                if kind != 'rows':
+                    pending.discard(csv_file)
+                yield csv_file, kind, payload
+
+    def write_rows(self, csv_file, rows, stock_ids, state, touched):
+        """
+        Upsert one parsed chunk in a single batch, recording the file's stock,
+        latest written date and any unknown tickers in its progress ``state`` and
+        every written stock with its earliest written date in ``touched``.
+        Returns the number of price rows written.
+        """
+        # Keyed by (stock_id, date) so a duplicated day in the file keeps its last row,
+        # the same outcome the per-row update_or_create used to give.
+        batch = {}
+        unknown_tickers = state['unknown_tickers']
+
+        for ticker, date, *values in rows:
+            stock_id = stock_ids.get(ticker)
+            if stock_id is None:
+                if ticker not in unknown_tickers:
+                    unknown_tickers.add(ticker)
+                    self.stdout.write(
+                        self.style.WARNING(f"Skipping rows for unknown ticker {ticker} in file {csv_file}")
+                    )
+                continue
+            if state['stock_id'] is None:
+                state['stock_id'] = stock_id
+            if stock_id not in touched or date < touched[stock_id]:
+                touched[stock_id] = date
+            if state['last_date'] is None or date > state['last_date']:
+                state['last_date'] = date
+
+            batch[(stock_id, date)] = StockPrice(
+                stock_id=stock_id, date=date, **dict(zip(PRICE_FIELDS, values))
+            )
+
+        if not batch:
+            return 0
+        return self.write_batch(batch.values())
+
+    def write_batch(self, prices):
+        """
+        Upsert a batch of StockPrice rows in a single transaction, relying on the
+        (stock, date) unique constraint to turn conflicting inserts into updates.
+        """
+        prices = list(prices)
+        with transaction.atomic():
+            StockPrice.objects.bulk_create(
+                prices,
+                update_conflicts=True,
+                unique_fields=['stock', 'date'],
+                update_fields=PRICE_FIELDS,
+            )
+        return len(prices)
@@ -11,28 +11,24 @@ root_dir = os.path.dirname(root_dir)
 dataset_dir = os.path.join(root_dir, 'dataset')
 files = os.listdir(dataset_dir)
 
-# go through each csv
+# go through each csv, streaming rows into a temporary file so memory use
+# does not depend on the size of the csv
 for file in files:
     if file.endswith('.csv') and file != 'stock_metadata.csv':
         file_path = os.path.join(dataset_dir, file)
-        with open(file_path, 'r', encoding='utf-8') as f:
+        tmp_path = file_path + '.tmp'
+        with open(file_path, 'r', encoding='utf-8') as f, \
+                open(tmp_path, 'w', encoding='utf-8', newline='') as out:
             reader = csv.DictReader(f)
-            new_csv = []
+            writer = csv.DictWriter(out, fieldnames=reader.fieldnames)
+            writer.writeheader()
             for row in reader:
                 ticker = row.get('Symbol', '').strip()
 
                 if(ticker != file.split('.')[0].upper() and ticker != 'M&M'):
                     ticker = file.split('.')[0].upper()
-                
-                new_row = {}
 
-                for key in row.keys():
-                    new_row[key] = row[key]
-                new_row['Symbol'] = ticker
-                new_csv.append(new_row)
-            #print count
-        # write the new csv file into the same file
-        with open(file_path, 'w', encoding='utf-8', newline='') as f:
-            writer = csv.DictWriter(f, fieldnames=reader.fieldnames)
-            writer.writeheader()
-            writer.writerows(new_csv)
+                row['Symbol'] = ticker
+                writer.writerow(row)
+        # replace the original csv file with the rewritten one
+        os.replace(tmp_path, file_path)
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from stocks.analytics import refresh_metrics
+from stocks.caching import bump_price_data_version
+from stocks.models import Stock
+
+
+class Command(BaseCommand):
+    help = 'Bring the StockMetric rows of every stock up to date with its StockPrice history'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild',
+            action='store_true',
+            help='Recompute every stock\'s metrics from its first price instead of only the missing days.',
+        )
+
+    def handle(self, *args, **options):
+        count = refresh_metrics(list(Stock.objects.values_list('id', flat=True)), rebuild=options['rebuild'])
+        # Cached and conditional responses built from the old metrics become misses.
+        bump_price_data_version()
+        self.stdout.write(self.style.SUCCESS(f"Wrote {count} stock metric rows."))
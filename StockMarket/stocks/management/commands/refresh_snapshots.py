@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from stocks.caching import bump_price_data_version
+from stocks.models import Stock
+from stocks.prices import refresh_snapshots
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the StockSnapshot of every stock from its StockPrice history'
+
+    def handle(self, *args, **options):
+        count = refresh_snapshots(list(Stock.objects.values_list('id', flat=True)))
+        # Cached and conditional responses built from the old snapshots become misses.
+        bump_price_data_version()
+        self.stdout.write(self.style.SUCCESS(f"Refreshed {count} stock snapshots."))
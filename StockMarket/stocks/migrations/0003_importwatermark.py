@@ -0,0 +1,60 @@
+# Generated by Django 5.2 on 2026-10-18 10:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("stocks", "0002_remove_watchlist_description_remove_watchlist_name"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ImportWatermark",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "source_file",
+                    models.CharField(
+                        help_text="CSV file name the prices were read from.",
+                        max_length=255,
+                        unique=True,
+                    ),
+                ),
+                (
+                    "last_date",
+                    models.DateField(
+                        blank=True,
+                        help_text="Latest StockPrice date stored for the stock.",
+                        null=True,
+                    ),
+                ),
+                ("file_size", models.BigIntegerField()),
+                ("file_mtime_ns", models.BigIntegerField()),
+                (
+                    "file_hash",
+                    models.CharField(
+                        help_text="SHA-256 of the CSV contents.", max_length=64
+                    ),
+                ),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "stock",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="import_watermark",
+                        to="stocks.stock",
+                    ),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,113 @@
+# Generated by Django 5.2 on 2026-10-18 10:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("stocks", "0003_importwatermark"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StockSnapshot",
+            fields=[
+                (
+                    "stock",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="snapshot",
+                        serialize=False,
+                        to="stocks.stock",
+                    ),
+                ),
+                ("date", models.DateField(blank=True, null=True)),
+                (
+                    "open_price",
+                    models.DecimalField(
+                        blank=True, decimal_places=4, max_digits=15, null=True
+                    ),
+                ),
+                (
+                    "high_price",
+                    models.DecimalField(
+                        blank=True, decimal_places=4, max_digits=15, null=True
+                    ),
+                ),
+                (
+                    "low_price",
+                    models.DecimalField(
+                        blank=True, decimal_places=4, max_digits=15, null=True
+                    ),
+                ),
+                (
+                    "close_price",
+                    models.DecimalField(
+                        blank=True, decimal_places=4, max_digits=15, null=True
+                    ),
+                ),
+                ("volume", models.BigIntegerField(blank=True, null=True)),
+                (
+                    "week_close",
+                    models.DecimalField(
+                        blank=True, decimal_places=4, max_digits=15, null=True
+                    ),
+                ),
+                (
+                    "month_close",
+                    models.DecimalField(
+                        blank=True, decimal_places=4, max_digits=15, null=True
+                    ),
+                ),
+                (
+                    "year_close",
+                    models.DecimalField(
+                        blank=True, decimal_places=4, max_digits=15, null=True
+                    ),
+                ),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "latest_price",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="+",
+                        to="stocks.stockprice",
+                    ),
+                ),
+                (
+                    "month_price",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="+",
+                        to="stocks.stockprice",
+                    ),
+                ),
+                (
+                    "week_price",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="+",
+                        to="stocks.stockprice",
+                    ),
+                ),
+                (
+                    "year_price",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="+",
+                        to="stocks.stockprice",
+                    ),
+                ),
+            ],
+        ),
+    ]
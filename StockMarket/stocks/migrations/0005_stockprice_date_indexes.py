@@ -0,0 +1,22 @@
+# Generated by Django 5.2 on 2026-10-18 10:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("stocks", "0004_stocksnapshot"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="stockprice",
+            index=models.Index(
+                fields=["stock", "-date"], name="stockprice_stock_date_desc"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="stockprice",
+            index=models.Index(fields=["-date"], name="stockprice_date_desc"),
+        ),
+    ]
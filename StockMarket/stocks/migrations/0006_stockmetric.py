@@ -0,0 +1,81 @@
+# Generated by Django 5.2 on 2026-10-18 11:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("stocks", "0005_stockprice_date_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StockMetric",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField()),
+                ("daily_return", models.FloatField(blank=True, null=True)),
+                (
+                    "volatility_20",
+                    models.FloatField(
+                        blank=True,
+                        help_text="Annualised volatility of the last 20 daily returns.",
+                        null=True,
+                    ),
+                ),
+                (
+                    "volatility_60",
+                    models.FloatField(
+                        blank=True,
+                        help_text="Annualised volatility of the last 60 daily returns.",
+                        null=True,
+                    ),
+                ),
+                (
+                    "volatility_252",
+                    models.FloatField(
+                        blank=True,
+                        help_text="Annualised volatility of the last 252 daily returns.",
+                        null=True,
+                    ),
+                ),
+                (
+                    "drawdown_252",
+                    models.FloatField(
+                        blank=True,
+                        help_text="Close relative to the highest close of the last 252 days, minus 1.",
+                        null=True,
+                    ),
+                ),
+                ("sma_20", models.FloatField(blank=True, null=True)),
+                ("sma_50", models.FloatField(blank=True, null=True)),
+                ("sma_200", models.FloatField(blank=True, null=True)),
+                (
+                    "stock",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="metrics",
+                        to="stocks.stock",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["-date"],
+                "indexes": [
+                    models.Index(
+                        fields=["stock", "-date"], name="stockmetric_stock_date_desc"
+                    )
+                ],
+                "unique_together": {("stock", "date")},
+            },
+        ),
+    ]
@@ -0,0 +1,97 @@
+# Generated by Django 5.2 on 2026-10-18 11:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("stocks", "0006_stockmetric"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="stocksnapshot",
+            name="distance_from_high",
+            field=models.FloatField(
+                blank=True,
+                help_text="Close relative to the 52-week high, minus 1.",
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="stocksnapshot",
+            name="high_52w",
+            field=models.DecimalField(
+                blank=True,
+                decimal_places=4,
+                help_text="Highest price of the last 365 days.",
+                max_digits=15,
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="stocksnapshot",
+            name="month_return",
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="stocksnapshot",
+            name="volatility",
+            field=models.FloatField(
+                blank=True,
+                help_text="Annualised volatility of the last 252 daily returns.",
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="stocksnapshot",
+            name="vwap_deviation",
+            field=models.FloatField(
+                blank=True,
+                help_text="Close relative to the day's VWAP, minus 1.",
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="stocksnapshot",
+            name="week_return",
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="stocksnapshot",
+            name="year_return",
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name="stocksnapshot",
+            index=models.Index(fields=["week_return"], name="snapshot_week_return"),
+        ),
+        migrations.AddIndex(
+            model_name="stocksnapshot",
+            index=models.Index(fields=["month_return"], name="snapshot_month_return"),
+        ),
+        migrations.AddIndex(
+            model_name="stocksnapshot",
+            index=models.Index(fields=["year_return"], name="snapshot_year_return"),
+        ),
+        migrations.AddIndex(
+            model_name="stocksnapshot",
+            index=models.Index(fields=["volatility"], name="snapshot_volatility"),
+        ),
+        migrations.AddIndex(
+            model_name="stocksnapshot",
+            index=models.Index(fields=["volume"], name="snapshot_volume"),
+        ),
+        migrations.AddIndex(
+            model_name="stocksnapshot",
+            index=models.Index(
+                fields=["distance_from_high"], name="snapshot_distance_from_high"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="stocksnapshot",
+            index=models.Index(
+                fields=["vwap_deviation"], name="snapshot_vwap_deviation"
+            ),
+        ),
+    ]
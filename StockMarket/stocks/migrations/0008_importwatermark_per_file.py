@@ -0,0 +1,31 @@
+# Generated by Django 5.2 on 2026-10-18 11:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("stocks", "0007_stocksnapshot_screener"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="importwatermark",
+            name="last_date",
+            field=models.DateField(
+                blank=True,
+                help_text="Latest price date imported from the file.",
+                null=True,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="importwatermark",
+            name="stock",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="import_watermarks",
+                to="stocks.stock",
+            ),
+        ),
+    ]
@@ -0,0 +1,16 @@
+# Generated by Django 5.2 on 2026-10-18 11:57
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("stocks", "0008_importwatermark_per_file"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="stockprice",
+            name="stockprice_stock_date_desc",
+        ),
+    ]
@@ -26,6 +26,12 @@ class StockPrice(models.Model):
     class Meta:
         unique_together = ('stock', 'date')  # Ensures one record per day for each stock
         ordering = ['-date']
+        # Latest / as-of-date lookups (WHERE stock_id = ? [AND date <= ?] ORDER BY date DESC)
+        # scan the (stock, date) unique index backwards.
+        indexes = [
+            # Newest date across all stocks, e.g. the last ingested day.
+            models.Index(fields=['-date'], name='stockprice_date_desc'),
+        ]
 
     def __str__(self):
         return f"{self.stock.ticker} on {self.date}"
@@ -59,4 +65,87 @@ class Watchlist(models.Model):
     stocks = models.ManyToManyField(Stock, related_name="watchlists", blank=True)
 
     def __str__(self):
-        return self.name
\ No newline at end of file
+        return self.name
+
+class ImportWatermark(models.Model):
+    # Remembers what import_all_csv last ingested from a CSV file, so later runs can
+    # skip the file when it is unchanged and otherwise load only newer rows.
+    # Several files may feed the same stock.
+    stock = models.ForeignKey(Stock, related_name="import_watermarks", on_delete=models.CASCADE)
+    source_file = models.CharField(max_length=255, unique=True, help_text="CSV file name the prices were read from.")
+    last_date = models.DateField(blank=True, null=True, help_text="Latest price date imported from the file.")
+    file_size = models.BigIntegerField()
+    file_mtime_ns = models.BigIntegerField()
+    file_hash = models.CharField(max_length=64, help_text="SHA-256 of the CSV contents.")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.stock.ticker} up to {self.last_date}"
+
+
+class StockSnapshot(models.Model):
+    # Denormalised latest quote of a stock plus its week/month/year reference prices,
+    # refreshed by import_all_csv so reads don't have to scan StockPrice.
+    stock = models.OneToOneField(Stock, related_name="snapshot", on_delete=models.CASCADE, primary_key=True)
+    latest_price = models.ForeignKey(StockPrice, related_name="+", on_delete=models.SET_NULL, blank=True, null=True)
+    week_price = models.ForeignKey(StockPrice, related_name="+", on_delete=models.SET_NULL, blank=True, null=True)
+    month_price = models.ForeignKey(StockPrice, related_name="+", on_delete=models.SET_NULL, blank=True, null=True)
+    year_price = models.ForeignKey(StockPrice, related_name="+", on_delete=models.SET_NULL, blank=True, null=True)
+    date = models.DateField(blank=True, null=True)
+    open_price = models.DecimalField(max_digits=15, decimal_places=4, blank=True, null=True)
+    high_price = models.DecimalField(max_digits=15, decimal_places=4, blank=True, null=True)
+    low_price = models.DecimalField(max_digits=15, decimal_places=4, blank=True, null=True)
+    close_price = models.DecimalField(max_digits=15, decimal_places=4, blank=True, null=True)
+    volume = models.BigIntegerField(blank=True, null=True)
+    week_close = models.DecimalField(max_digits=15, decimal_places=4, blank=True, null=True)
+    month_close = models.DecimalField(max_digits=15, decimal_places=4, blank=True, null=True)
+    year_close = models.DecimalField(max_digits=15, decimal_places=4, blank=True, null=True)
+    # Screener columns, derived from the prices above and the latest StockMetric row.
+    week_return = models.FloatField(blank=True, null=True)
+    month_return = models.FloatField(blank=True, null=True)
+    year_return = models.FloatField(blank=True, null=True)
+    volatility = models.FloatField(blank=True, null=True, help_text="Annualised volatility of the last 252 daily returns.")
+    high_52w = models.DecimalField(max_digits=15, decimal_places=4, blank=True, null=True, help_text="Highest price of the last 365 days.")
+    distance_from_high = models.FloatField(blank=True, null=True, help_text="Close relative to the 52-week high, minus 1.")
+    vwap_deviation = models.FloatField(blank=True, null=True, help_text="Close relative to the day's VWAP, minus 1.")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        # One index per screener column, so range filters and sorts over all stocks are index scans.
+        indexes = [
+            models.Index(fields=['week_return'], name='snapshot_week_return'),
+            models.Index(fields=['month_return'], name='snapshot_month_return'),
+            models.Index(fields=['year_return'], name='snapshot_year_return'),
+            models.Index(fields=['volatility'], name='snapshot_volatility'),
+            models.Index(fields=['volume'], name='snapshot_volume'),
+            models.Index(fields=['distance_from_high'], name='snapshot_distance_from_high'),
+            models.Index(fields=['vwap_deviation'], name='snapshot_vwap_deviation'),
+        ]
+
+    def __str__(self):
+        return f"{self.stock.ticker} snapshot on {self.date}"
+
+
+class StockMetric(models.Model):
+    # Daily return and rolling risk/trend figures of a stock, derived from its close
+    # prices and extended by import_all_csv for just the days it appends.
+    stock = models.ForeignKey(Stock, related_name='metrics', on_delete=models.CASCADE)
+    date = models.DateField()
+    daily_return = models.FloatField(blank=True, null=True)
+    volatility_20 = models.FloatField(blank=True, null=True, help_text="Annualised volatility of the last 20 daily returns.")
+    volatility_60 = models.FloatField(blank=True, null=True, help_text="Annualised volatility of the last 60 daily returns.")
+    volatility_252 = models.FloatField(blank=True, null=True, help_text="Annualised volatility of the last 252 daily returns.")
+    drawdown_252 = models.FloatField(blank=True, null=True, help_text="Close relative to the highest close of the last 252 days, minus 1.")
+    sma_20 = models.FloatField(blank=True, null=True)
+    sma_50 = models.FloatField(blank=True, null=True)
+    sma_200 = models.FloatField(blank=True, null=True)
+
+    class Meta:
+        unique_together = ('stock', 'date')
+        ordering = ['-date']
+        indexes = [
+            models.Index(fields=['stock', '-date'], name='stockmetric_stock_date_desc'),
+        ]
+
+    def __str__(self):
+        return f"{self.stock.ticker} metrics on {self.date}"
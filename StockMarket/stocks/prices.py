@@ -0,0 +1,248 @@
+from asgiref.sync import sync_to_async
+from datetime import timedelta
+from django.db.models import DateField, ExpressionWrapper, F, Max, OuterRef, Subquery
+from stocks.models import PortfolioStock, Stock, StockMetric, StockPrice, StockSnapshot
+
+# Reference prices shown next to the latest price, as days back from the latest date.
+REFERENCE_OFFSETS = {
+    'week': 7,
+    'month': 30,
+    'year': 365,
+}
+
+
+def reference_price_ids(stock_ids):
+    """
+    Return ``{stock_id: {'latest': id, 'week': id, 'month': id, 'year': id}}``
+    with the StockPrice ids of each stock's latest row and of the most recent
+    row on or before 7/30/365 days earlier, computed in a single query.
+    Missing rows are None.
+    """
+    latest = StockPrice.objects.filter(stock=OuterRef('pk')).order_by('-date')
+    queryset = Stock.objects.filter(pk__in=stock_ids).annotate(
+        latest_date=Subquery(latest.values('date')[:1]),
+        latest_id=Subquery(latest.values('id')[:1]),
+    )
+    for key, days in REFERENCE_OFFSETS.items():
+        target_date = ExpressionWrapper(OuterRef('latest_date') - timedelta(days=days), output_field=DateField())
+        reference = StockPrice.objects.filter(stock=OuterRef('pk'), date__lte=target_date).order_by('-date')
+        queryset = queryset.annotate(**{f'{key}_id': Subquery(reference.values('id')[:1])})
+
+    keys = ['latest', *REFERENCE_OFFSETS]
+    rows = queryset.values_list('pk', *(f'{key}_id' for key in keys))
+    return {row[0]: dict(zip(keys, row[1:])) for row in rows}
+
+
+def reference_prices(stock_ids):
+    """
+    Like :func:`reference_price_ids`, but with the StockPrice rows themselves,
+    loaded with one extra query.
+    """
+    ids = reference_price_ids(stock_ids)
+    prices = StockPrice.objects.in_bulk(
+        {price_id for refs in ids.values() for price_id in refs.values() if price_id is not None}
+    )
+    return {
+        stock_id: {key: prices.get(price_id) for key, price_id in refs.items()}
+        for stock_id, refs in ids.items()
+    }
+
+
+def screener_inputs(stock_ids):
+    """
+    Return ``{stock_id: (high_52w, volatility)}``: the highest price of the 365
+    days up to each stock's latest date and the 252-day volatility of its latest
+    StockMetric row, computed in a single query.
+    """
+    latest = StockPrice.objects.filter(stock=OuterRef('pk')).order_by('-date')
+    year_ago = ExpressionWrapper(OuterRef('latest_date') - timedelta(days=365), output_field=DateField())
+    high = StockPrice.objects.filter(stock=OuterRef('pk'), date__gt=year_ago).order_by().values('stock')
+    metric = StockMetric.objects.filter(stock=OuterRef('pk')).order_by('-date')
+    rows = Stock.objects.filter(pk__in=stock_ids).annotate(
+        latest_date=Subquery(latest.values('date')[:1]),
+    ).annotate(
+        high_52w=Subquery(high.annotate(high=Max('high_price')).values('high')),
+        volatility=Subquery(metric.values('volatility_252')[:1]),
+    ).values_list('pk', 'high_52w', 'volatility')
+    return {stock_id: (high_52w, volatility) for stock_id, high_52w, volatility in rows}
+
+
+def relative_change(value, base):
+    # value / base - 1, or None if either is missing.
+    if value is None or not base:
+        return None
+    return float(value / base) - 1
+
+
+def refresh_snapshots(stock_ids):
+    """
+    Recompute the StockSnapshot of the given stocks from their StockPrice rows
+    and latest StockMetric row.
+    Called after an import for just the stocks that received new rows.
+    """
+    snapshots = []
+    inputs = screener_inputs(stock_ids)
+    for stock_id, refs in reference_prices(stock_ids).items():
+        latest, week, month, year = (refs[key] for key in ['latest', *REFERENCE_OFFSETS])
+        close = latest.close_price if latest else None
+        high_52w, volatility = inputs.get(stock_id, (None, None))
+        snapshots.append(StockSnapshot(
+            stock_id=stock_id,
+            latest_price=latest,
+            week_price=week,
+            month_price=month,
+            year_price=year,
+            date=latest.date if latest else None,
+            open_price=latest.open_price if latest else None,
+            high_price=latest.high_price if latest else None,
+            low_price=latest.low_price if latest else None,
+            close_price=latest.close_price if latest else None,
+            volume=latest.volume if latest else None,
+            week_close=week.close_price if week else None,
+            month_close=month.close_price if month else None,
+            year_close=year.close_price if year else None,
+            week_return=relative_change(close, week.close_price if week else None),
+            month_return=relative_change(close, month.close_price if month else None),
+            year_return=relative_change(close, year.close_price if year else None),
+            volatility=volatility,
+            high_52w=high_52w,
+            distance_from_high=relative_change(close, high_52w),
+            vwap_deviation=relative_change(close, latest.VWAP if latest else None),
+        ))
+
+    StockSnapshot.objects.bulk_create(
+        snapshots,
+        update_conflicts=True,
+        unique_fields=['stock'],
+        update_fields=[
+            field.name for field in StockSnapshot._meta.concrete_fields if not field.primary_key
+        ],
+    )
+    return len(snapshots)
+
+
+def reference_snapshots(stocks):
+    # Snapshots of the given stocks with their reference StockPrice rows joined in.
+    return StockSnapshot.objects.filter(stock__in=[stock.pk for stock in stocks]).select_related(
+        'latest_price', 'week_price', 'month_price', 'year_price'
+    )
+
+
+def set_snapshot_prices(stocks, snapshots):
+    # Sets _reference_prices from {stock_id: snapshot}; returns the stocks without a snapshot.
+    missing = []
+    for stock in stocks:
+        snapshot = snapshots.get(stock.pk)
+        if snapshot is None:
+            missing.append(stock)
+            continue
+        stock._reference_prices = {
+            'latest': snapshot.latest_price,
+            'week': snapshot.week_price,
+            'month': snapshot.month_price,
+            'year': snapshot.year_price,
+        }
+    return missing
+
+
+def attach_reference_prices(stocks):
+    """
+    Set ``_reference_prices`` on every stock to a dict of its latest, week,
+    month and year reference StockPrice rows (or None). Stocks with a
+    StockSnapshot are served from it in one joined query; the rest are
+    computed from StockPrice with two more, no matter how many stocks are passed.
+    """
+    stocks = [stock for stock in stocks if not hasattr(stock, '_reference_prices')]
+    if not stocks:
+        return
+
+    snapshots = {snapshot.stock_id: snapshot for snapshot in reference_snapshots(stocks)}
+    missing = set_snapshot_prices(stocks, snapshots)
+    if not missing:
+        return
+
+    computed = reference_prices([stock.pk for stock in missing])
+    for stock in missing:
+        stock._reference_prices = computed[stock.pk]
+
+
+async def aattach_reference_prices(stocks):
+    """
+    Async version of :func:`attach_reference_prices`.
+    """
+    stocks = [stock for stock in stocks if not hasattr(stock, '_reference_prices')]
+    if not stocks:
+        return
+
+    snapshots = {snapshot.stock_id: snapshot async for snapshot in reference_snapshots(stocks)}
+    missing = set_snapshot_prices(stocks, snapshots)
+    if not missing:
+        return
+
+    # Only stocks not imported since snapshots were added get here.
+    computed = await sync_to_async(reference_prices)([stock.pk for stock in missing])
+    for stock in missing:
+        stock._reference_prices = computed[stock.pk]
+
+
+def price_history_rows(stock_ids, columns, date_from=None, date_to=None):
+    """
+    The ``values_list()`` query behind :func:`price_history`, ordered by stock
+    and newest first, and the position of stock_id in its rows.
+    """
+    queryset = StockPrice.objects.filter(stock__in=stock_ids)
+    if date_from:
+        queryset = queryset.filter(date__gte=date_from)
+    if date_to:
+        queryset = queryset.filter(date__lte=date_to)
+
+    # values_list() collapses repeated columns, so only add stock_id if it is missing.
+    selected = columns if 'stock_id' in columns else [*columns, 'stock_id']
+    return queryset.order_by('stock_id', '-date').values_list(*selected), selected.index('stock_id')
+
+
+def price_history(stock_ids, columns, date_from=None, date_to=None):
+    """
+    Return ``{stock_id: [row, ...]}`` with ``values_list(*columns)`` rows of
+    each stock's prices between the optional date bounds, newest first,
+    loaded in a single query.
+    """
+    columns = list(columns)
+    rows, key = price_history_rows(stock_ids, columns, date_from, date_to)
+    history = {stock_id: [] for stock_id in stock_ids}
+    for row in rows:
+        history[row[key]].append(row[:len(columns)])
+    return history
+
+
+async def aprice_history(stock_ids, columns, date_from=None, date_to=None):
+    """
+    Async version of :func:`price_history`.
+    """
+    columns = list(columns)
+    rows, key = price_history_rows(stock_ids, columns, date_from, date_to)
+    history = {stock_id: [] for stock_id in stock_ids}
+    async for row in rows:
+        history[row[key]].append(row[:len(columns)])
+    return history
+
+
+def valued_holdings(portfolio_id):
+    """
+    The portfolio's holdings as ``values()`` rows with their latest close,
+    market value, cost basis and unrealised P&L, computed in a single query.
+    Holdings without any close price have None for the latest close, market
+    value and P&L.
+    """
+    latest_close = StockPrice.objects.filter(stock=OuterRef('stock'), close_price__isnull=False).order_by('-date')
+    return PortfolioStock.objects.filter(portfolio=portfolio_id).annotate(
+        current_close=Subquery(latest_close.values('close_price')[:1]),
+    ).annotate(
+        market_value=F('current_close') * F('shares'),
+        cost_basis=F('buy_price') * F('shares'),
+    ).annotate(
+        unrealised_pnl=F('market_value') - F('cost_basis'),
+    ).order_by('pk').values(
+        'stock_id', 'stock__ticker', 'buy_price', 'shares', 'current_close',
+        'market_value', 'cost_basis', 'unrealised_pnl',
+    )
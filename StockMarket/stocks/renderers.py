@@ -0,0 +1,65 @@
+import datetime
+import json
+import math
+import struct
+import sys
+from array import array
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+EPOCH = datetime.date(1970, 1, 1)
+
+
+class ColumnarBinaryRenderer(BaseRenderer):
+    """
+    Packs a columnar response ({"date": [...], "close": [...], ...}) into
+    little-endian arrays that clients can map straight into typed arrays
+    (e.g. ``Float64Array`` or ``numpy.frombuffer``).
+
+    Layout: a uint32 header length, a UTF-8 JSON header
+    ``{"length": n, "columns": [{"name", "dtype", "offset"}...]}`` and then the
+    column buffers. Dates are ``<i4`` days since 1970-01-01; every other column
+    is ``<f8`` with NaN for missing values.
+    """
+    media_type = 'application/octet-stream'
+    format = 'bin'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        response = (renderer_context or {}).get('response')
+        if response is not None and response.exception:
+            # Errors stay readable, and are labelled as the JSON they are.
+            response['Content-Type'] = JSONRenderer.media_type
+            return JSONRenderer().render(data, renderer_context=renderer_context)
+
+        columns = []
+        buffers = []
+        offset = 0
+        for name, values in data.items():
+            if name == 'date' or (values and isinstance(values[0], datetime.date)):
+                dtype = '<i4'
+                buffer = array('i', [(value - EPOCH).days for value in values])
+            else:
+                dtype = '<f8'
+                buffer = array('d', [math.nan if value is None else float(value) for value in values])
+            if sys.byteorder == 'big':
+                buffer.byteswap()
+            columns.append({'name': name, 'dtype': dtype, 'offset': offset})
+            buffers.append(buffer.tobytes())
+            offset += len(buffers[-1])
+
+        length = len(next(iter(data.values()), []))
+        header = json.dumps({'length': length, 'columns': columns}).encode('utf-8')
+        return struct.pack('<I', len(header)) + header + b''.join(buffers)
+
+
+class EventStreamRenderer(BaseRenderer):
+    """
+    Lets streaming views accept ``Accept: text/event-stream``. The streams are
+    StreamingHttpResponses, so this only renders errors, as an ``error`` event.
+    """
+    media_type = 'text/event-stream'
+    format = 'event-stream'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return b'event: error\ndata: ' + JSONRenderer().render(data) + b'\n\n'
@@ -0,0 +1,130 @@
+import bisect
+import heapq
+import re
+import threading
+import time
+from collections import defaultdict
+from stocks.models import Stock
+
+# Rebuild the index at least this often, so stocks added by another process
+# (e.g. import_all_csv) show up without a restart.
+SEARCH_INDEX_MAX_AGE = 5 * 60
+# Minimum trigram similarity (Dice coefficient) of a fuzzy match.
+FUZZY_THRESHOLD = 0.4
+
+# Match kinds, best first.
+EXACT_TICKER, TICKER_PREFIX, NAME_PREFIX, WORD_PREFIX, FUZZY = range(5)
+
+
+def compact(text):
+    # Lower case with everything but letters and digits removed: 'M&M' -> 'mm'.
+    return re.sub(r'[^0-9a-z]+', '', (text or '').lower())
+
+
+def words(text):
+    return [word for word in re.split(r'[^0-9a-z]+', (text or '').lower()) if word]
+
+
+def trigrams(key):
+    padded = f'  {key} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class StockSearchIndex:
+    """
+    In-memory typeahead index over stock tickers and company names.
+
+    Prefixes are looked up by bisecting one sorted list of keys (the ticker,
+    the whole name and each later word of the name), and typos or partial
+    words fall back to a trigram index. Results are ranked by match kind:
+    exact ticker, ticker prefix, name prefix, word prefix, then fuzzy.
+    """
+
+    def __init__(self, stocks):
+        # stocks: (id, ticker, company_name, industry) tuples.
+        self.stocks = [
+            {'id': stock_id, 'ticker': ticker, 'company_name': company_name, 'industry': industry}
+            for stock_id, ticker, company_name, industry in stocks
+        ]
+
+        entries = []
+        for position, stock in enumerate(self.stocks):
+            entries.append((compact(stock['ticker']), TICKER_PREFIX, position))
+            entries.append((compact(stock['company_name']), NAME_PREFIX, position))
+            entries.extend((word, WORD_PREFIX, position) for word in words(stock['company_name'])[1:])
+        entries = sorted(entry for entry in entries if entry[0])
+        self.keys = [key for key, _, _ in entries]
+        self.matches = [(kind, position) for _, kind, position in entries]
+
+        self.key_trigrams = [len(trigrams(key)) for key in self.keys]
+        self.trigram_keys = defaultdict(list)
+        for index, key in enumerate(self.keys):
+            for trigram in trigrams(key):
+                self.trigram_keys[trigram].append(index)
+
+    def search(self, query, limit=10):
+        """
+        Return up to ``limit`` stock dicts matching ``query``, best first.
+        """
+        query = compact(query)
+        if not query:
+            return []
+
+        # Best (kind, -similarity) rank per stock position.
+        best = {}
+
+        def consider(position, rank):
+            if position not in best or rank < best[position]:
+                best[position] = rank
+
+        start = bisect.bisect_left(self.keys, query)
+        end = bisect.bisect_left(self.keys, query + '\x7f', lo=start)
+        for index in range(start, end):
+            kind, position = self.matches[index]
+            if kind == TICKER_PREFIX and self.keys[index] == query:
+                kind = EXACT_TICKER
+            consider(position, (kind, 0))
+
+        if len(best) < limit and len(query) >= 3:
+            query_trigrams = trigrams(query)
+            shared = defaultdict(int)
+            for trigram in query_trigrams:
+                for index in self.trigram_keys.get(trigram, ()):
+                    shared[index] += 1
+            for index, count in shared.items():
+                similarity = 2 * count / (len(query_trigrams) + self.key_trigrams[index])
+                if similarity >= FUZZY_THRESHOLD:
+                    consider(self.matches[index][1], (FUZZY, -similarity))
+
+        def order(position):
+            ticker = self.stocks[position]['ticker']
+            return best[position], len(ticker), ticker
+
+        return [self.stocks[position] for position in heapq.nsmallest(limit, best, key=order)]
+
+
+_index = None
+_built_at = 0.0
+_lock = threading.Lock()
+
+
+def get_search_index():
+    """
+    The process-wide StockSearchIndex, built from the Stock table on first use
+    and again after :func:`invalidate_search_index` or SEARCH_INDEX_MAX_AGE.
+    """
+    global _index, _built_at
+    index = _index
+    if index is None or time.monotonic() - _built_at > SEARCH_INDEX_MAX_AGE:
+        with _lock:
+            if _index is index:
+                _index = StockSearchIndex(Stock.objects.values_list('id', 'ticker', 'company_name', 'industry'))
+                _built_at = time.monotonic()
+            index = _index
+    return index
+
+
+def invalidate_search_index(**kwargs):
+    # Signal receiver friendly: the next search rebuilds the index.
+    global _index
+    _index = None
@@ -1,7 +1,8 @@
 from rest_framework import serializers
+from django.db import models
 from stocks.models import Stock, StockPrice, Portfolio, Watchlist, PortfolioStock
-import datetime
-from datetime import timedelta
+from stocks.prices import aprice_history, attach_reference_prices, price_history
+import functools
 
 class StockPriceSerializer(serializers.ModelSerializer):
     class Meta:
@@ -9,13 +10,85 @@ class StockPriceSerializer(serializers.ModelSerializer):
         fields = '__all__'
         read_only_fields = list(fields)  # OR just list all fields manually, safer!
 
+    def __init__(self, *args, fields=None, **kwargs):
+        # Optionally restrict the output to a subset of fields, e.g. ['date', 'close_price'].
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+@functools.cache
+def price_row_format():
+    """
+    Return ``(columns, format_row)``: the StockPrice columns to load with
+    values_list and a function turning one such row into the same dict
+    StockPriceSerializer produces, without a model or serializer per row.
+    """
+    columns, names, converters = [], [], []
+    for name, field in StockPriceSerializer().fields.items():
+        names.append(name)
+        if isinstance(field, serializers.RelatedField):
+            columns.append(f'{field.source}_id')
+            converters.append(None)  # primary keys are output as-is
+        else:
+            columns.append(field.source)
+            converters.append(field.to_representation)
+
+    def format_row(row):
+        return {
+            name: value if value is None or convert is None else convert(value)
+            for name, convert, value in zip(names, converters, row)
+        }
+    return columns, format_row
+
+def attach_price_history(stocks, date_from=None, date_to=None):
+    # Sets _price_history on every stock with one query for all of them.
+    stocks = [stock for stock in stocks if not hasattr(stock, '_price_history')]
+    if not stocks:
+        return
+    columns, format_row = price_row_format()
+    history = price_history([stock.pk for stock in stocks], columns, date_from, date_to)
+    for stock in stocks:
+        stock._price_history = [format_row(row) for row in history[stock.pk]]
+
+async def aattach_price_history(stocks, date_from=None, date_to=None):
+    # Async version of attach_price_history(), for async views.
+    stocks = [stock for stock in stocks if not hasattr(stock, '_price_history')]
+    if not stocks:
+        return
+    columns, format_row = price_row_format()
+    history = await aprice_history([stock.pk for stock in stocks], columns, date_from, date_to)
+    for stock in stocks:
+        stock._price_history = [format_row(row) for row in history[stock.pk]]
+
+class StockListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        stocks = list(data.all() if isinstance(data, models.manager.BaseManager) else data)
+        attach_price_history(stocks, *self.context.get('price_window', (None, None)))
+        return super().to_representation(stocks)
+
 class StockSerializer(serializers.ModelSerializer):
-    prices = StockPriceSerializer(many=True, read_only=True)  # uses related_name='prices'
+    # Serialised from values_list rows rather than one StockPriceSerializer per row;
+    # the output matches StockPriceSerializer(many=True).
+    prices = serializers.SerializerMethodField()
 
     class Meta:
         model = Stock
         fields = '__all__'
         read_only_fields = list(fields)
+        list_serializer_class = StockListSerializer
+
+    def get_prices(self, obj):
+        attach_price_history([obj], *self.context.get('price_window', (None, None)))
+        return obj._price_history
+
+class StockBasicListSerializer(serializers.ListSerializer):
+    # Loads the reference prices of every stock in the list up front, so listing
+    # N stocks costs a constant number of queries instead of several per stock.
+    def to_representation(self, data):
+        stocks = list(data.all() if isinstance(data, models.manager.BaseManager) else data)
+        attach_reference_prices(stocks)
+        return super().to_representation(stocks)
 
 class StockSerializerBasic(serializers.ModelSerializer):
     latest_price = serializers.SerializerMethodField()
@@ -27,44 +100,30 @@ class StockSerializerBasic(serializers.ModelSerializer):
         model = Stock
         fields = ('id', 'ticker', 'company_name', 'series', 'industry', 
                   'latest_price', 'week_before_price', 'month_before_price', 'year_before_price')
+        list_serializer_class = StockBasicListSerializer
+
+    def reference_price(self, obj, key):
+        # Single stocks (e.g. retrieve) go through the same lookup as lists.
+        attach_reference_prices([obj])
+        price = obj._reference_prices[key]
+        if price:
+            return StockPriceSerializer(price).data
+        return None
 
     def get_latest_price(self, obj):
-        latest = obj.prices.first()  # Assumes prices are ordered by '-date'
-        if latest:
-            return StockPriceSerializer(latest).data
-        return None
+        return self.reference_price(obj, 'latest')
     
     def get_week_before_price(self, obj):
-        latest = obj.prices.first()
-        if not latest:
-            return None
-        target_date = latest.date - timedelta(days=7)
-        week_ago = obj.prices.filter(date__lte=target_date).order_by("-date").first()
-        if week_ago:
-            return StockPriceSerializer(week_ago).data
-        return None
+        # Most recent price on or before 7 days before the latest date.
+        return self.reference_price(obj, 'week')
 
     def get_month_before_price(self, obj):
-        latest = obj.prices.first()
-        if not latest:
-            return None
-        # Subtract 30 days from latest date
-        target_date = latest.date - timedelta(days=30)
-        # Get the most recent price that is older than or equal to the target_date.
-        month_ago = obj.prices.filter(date__lte=target_date).order_by("-date").first()
-        if month_ago:
-            return StockPriceSerializer(month_ago).data
-        return None
+        # Most recent price on or before 30 days before the latest date.
+        return self.reference_price(obj, 'month')
 
     def get_year_before_price(self, obj):
-        latest = obj.prices.first()
-        if not latest:
-            return None
-        target_date = latest.date - timedelta(days=365)
-        year_ago = obj.prices.filter(date__lte=target_date).order_by("-date").first()
-        if year_ago:
-            return StockPriceSerializer(year_ago).data
-        return None
+        # Most recent price on or before 365 days before the latest date.
+        return self.reference_price(obj, 'year')
 
 
 # Serializer for the through model PortfolioStock.
@@ -78,6 +137,10 @@ class PortfolioStockSerializer(serializers.ModelSerializer):
         fields = ['id', 'ticker', 'buy_price', 'shares', 'current_close']
     
     def get_current_close(self, obj):
+        # Prefer the snapshot kept up to date by import_all_csv.
+        snapshot = getattr(obj.stock, 'snapshot', None)
+        if snapshot is not None:
+            return snapshot.close_price
         latest_price = obj.stock.prices.first()  # Assuming ordering by descending date
         if latest_price and latest_price.close_price is not None:
             return latest_price.close_price
@@ -95,24 +158,75 @@ class PortfolioSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         stocks_data = validated_data.pop('portfoliostock_set', [])
         portfolio = Portfolio.objects.create(**validated_data)
-        for stock_data in stocks_data:
-            # Expect the input to have a structure: {"stock": {"ticker": "AXISBANK"}, "buy_price": 10, "shares": 1000}
-            ticker = stock_data.get('stock', {}).get('ticker')
-            buy_price = stock_data.get('buy_price')
-            shares = stock_data.get('shares')
-            try:
-                stock = Stock.objects.get(ticker=ticker)
-                PortfolioStock.objects.create(
+        # Expect the input to have a structure: {"stock": {"ticker": "AXISBANK"}, "buy_price": 10, "shares": 1000}
+        tickers = [stock_data.get('stock', {}).get('ticker') for stock_data in stocks_data]
+        # Resolve every ticker in one query; unknown tickers are skipped.
+        stock_ids = dict(Stock.objects.filter(ticker__in=tickers).values_list('ticker', 'id'))
+        holdings = {}
+        for ticker, stock_data in zip(tickers, stocks_data):
+            if ticker in stock_ids:
+                holdings[ticker] = PortfolioStock(
                     portfolio=portfolio,
-                    stock=stock,
-                    buy_price=buy_price,
-                    shares=shares
+                    stock_id=stock_ids[ticker],
+                    buy_price=stock_data.get('buy_price'),
+                    shares=stock_data.get('shares')
                 )
-            except Stock.DoesNotExist:
-                # Optionally log or skip the stock if not found.
-                continue
+        PortfolioStock.objects.bulk_create(holdings.values())
         return portfolio
 
+class StockScreenSerializer(serializers.ModelSerializer):
+    # Precomputed screener columns, read from the stock's snapshot.
+    date = serializers.DateField(source='snapshot.date')
+    close_price = serializers.DecimalField(source='snapshot.close_price', max_digits=15, decimal_places=4)
+    volume = serializers.IntegerField(source='snapshot.volume')
+    week_return = serializers.FloatField(source='snapshot.week_return')
+    month_return = serializers.FloatField(source='snapshot.month_return')
+    year_return = serializers.FloatField(source='snapshot.year_return')
+    volatility = serializers.FloatField(source='snapshot.volatility')
+    high_52w = serializers.DecimalField(source='snapshot.high_52w', max_digits=15, decimal_places=4)
+    distance_from_high = serializers.FloatField(source='snapshot.distance_from_high')
+    vwap_deviation = serializers.FloatField(source='snapshot.vwap_deviation')
+
+    class Meta:
+        model = Stock
+        fields = [
+            'id', 'ticker', 'company_name', 'industry', 'date', 'close_price', 'volume',
+            'week_return', 'month_return', 'year_return', 'volatility', 'high_52w',
+            'distance_from_high', 'vwap_deviation',
+        ]
+
+
+class PortfolioPositionSerializer(serializers.Serializer):
+    # One line of a bulk positions request; stock is a stock id or ticker.
+    stock = serializers.CharField()
+    buy_price = serializers.DecimalField(max_digits=15, decimal_places=4)
+    shares = serializers.DecimalField(max_digits=15, decimal_places=4)
+
+
+class PortfolioHoldingSummarySerializer(serializers.Serializer):
+    # Serializes a row of stocks.prices.valued_holdings().
+    id = serializers.IntegerField(source='stock_id')
+    ticker = serializers.CharField(source='stock__ticker')
+    buy_price = serializers.DecimalField(max_digits=None, decimal_places=4)
+    shares = serializers.DecimalField(max_digits=None, decimal_places=4)
+    current_close = serializers.DecimalField(max_digits=None, decimal_places=4)
+    market_value = serializers.DecimalField(max_digits=None, decimal_places=4)
+    cost_basis = serializers.DecimalField(max_digits=None, decimal_places=4)
+    unrealised_pnl = serializers.DecimalField(max_digits=None, decimal_places=4)
+    weight = serializers.FloatField()
+
+
+class PortfolioSummarySerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    name = serializers.CharField()
+    market_value = serializers.DecimalField(max_digits=None, decimal_places=4)
+    # Totals over the valued holdings; holdings without a price are summed in unvalued_cost_basis.
+    cost_basis = serializers.DecimalField(max_digits=None, decimal_places=4)
+    unrealised_pnl = serializers.DecimalField(max_digits=None, decimal_places=4)
+    unvalued_cost_basis = serializers.DecimalField(max_digits=None, decimal_places=4)
+    stocks = PortfolioHoldingSummarySerializer(many=True)
+
+
 class NestedStockSerializer(serializers.ModelSerializer):
     ticker = serializers.CharField(required=True)
     id = serializers.IntegerField(read_only=True)  # fixed source reference
@@ -0,0 +1,37 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import Signal, receiver
+from stocks.models import Stock, StockPrice
+from stocks.analytics import refresh_metrics
+from stocks.caching import bump_price_data_version
+from stocks.prices import refresh_snapshots
+from stocks.search import invalidate_search_index
+from stocks.streaming import price_updates
+
+# Sent by import_all_csv once a run has written new StockPrice rows.
+# Receives ``stock_ids``: the ids of the stocks whose prices changed, and
+# ``first_dates``: ``{stock_id: earliest date written}``.
+prices_imported = Signal()
+
+
+@receiver(prices_imported, sender=StockPrice)
+def refresh_derived_data_on_import(sender, stock_ids, first_dates=None, **kwargs):
+    # Snapshots read the latest StockMetric row, so metrics go first.
+    refresh_metrics(stock_ids, since=first_dates)
+    refresh_snapshots(stock_ids)
+    # Cached responses built from the old prices become misses.
+    version = bump_price_data_version()
+    # Push the new quotes to price streams served by this process; other
+    # processes notice the version bump.
+    price_updates.refresh(version)
+
+
+@receiver(post_save, sender=Stock, dispatch_uid='stocks.caching.stock_save')
+@receiver(post_delete, sender=Stock, dispatch_uid='stocks.caching.stock_delete')
+def bump_version_on_stock_change(sender, **kwargs):
+    # Responses show stock names and series, so a renamed stock must not be served from cache or 304'd.
+    bump_price_data_version()
+
+
+# Added, renamed or deleted stocks show up in the next search.
+post_save.connect(invalidate_search_index, sender=Stock, dispatch_uid='stocks.search.save')
+post_delete.connect(invalidate_search_index, sender=Stock, dispatch_uid='stocks.search.delete')
@@ -0,0 +1,204 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+from django.db import close_old_connections
+from stocks.caching import price_data_version
+from stocks.models import StockSnapshot
+from stocks.prices import relative_change
+
+logger = logging.getLogger(__name__)
+
+# How often (in seconds) a web process checks whether another process, e.g.
+# import_all_csv, has written new prices while clients are subscribed.
+PRICE_UPDATE_POLL_SECONDS = 5
+
+# Price streams end after this many seconds and clients reconnect after
+# PRICE_STREAM_RETRY_MS, so subscriptions pick up watchlist and portfolio
+# changes; idle streams send a comment every PRICE_STREAM_HEARTBEAT_SECONDS.
+PRICE_STREAM_SECONDS = 10 * 60
+PRICE_STREAM_RETRY_MS = 3000
+PRICE_STREAM_HEARTBEAT_SECONDS = 15
+
+
+def price_delta_rows(stock_ids):
+    return StockSnapshot.objects.filter(stock__in=stock_ids).values_list(
+        'stock_id', 'stock__ticker', 'date', 'close_price', 'latest_price__prev_close_price', 'volume'
+    )
+
+
+def price_delta(row):
+    # Compact latest quote of a stock, built from a price_delta_rows() row.
+    stock_id, ticker, date, close, prev_close, volume = row
+    return {
+        'id': stock_id,
+        'ticker': ticker,
+        'date': date.isoformat() if date else None,
+        'close': None if close is None else str(close),
+        'change': relative_change(close, prev_close),
+        'volume': volume,
+    }
+
+
+def price_deltas(stock_ids):
+    return [price_delta(row) for row in price_delta_rows(stock_ids)]
+
+
+async def aprice_deltas(stock_ids):
+    return [price_delta(row) async for row in price_delta_rows(stock_ids)]
+
+
+class Subscription:
+    """
+    Price updates for a set of stocks, read by one client on its event loop.
+    Deltas not read yet are coalesced per stock, so a slow client only ever
+    gets the latest quote of each.
+    """
+
+    def __init__(self, stock_ids, loop):
+        self.stock_ids = set(stock_ids)
+        self.loop = loop
+        self.pending = {}
+        self.ready = asyncio.Event()
+
+    def offer(self, deltas):
+        # Runs on self.loop.
+        self.pending.update((delta['id'], delta) for delta in deltas)
+        self.ready.set()
+
+    async def next(self, timeout):
+        """
+        Wait up to ``timeout`` seconds for updates and return them, or [] if none came.
+        """
+        try:
+            await asyncio.wait_for(self.ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return []
+        self.ready.clear()
+        deltas = list(self.pending.values())
+        self.pending.clear()
+        return deltas
+
+
+class PriceUpdates:
+    """
+    In-process pub/sub of latest-quote deltas, fanned out to the subscriptions
+    of the stocks that changed.
+
+    :meth:`refresh` compares the snapshots of every subscribed stock with the
+    last quotes sent and publishes the ones that differ. The import signal
+    calls it directly, and while anyone is subscribed a watcher thread calls
+    it whenever the price data version changes, which covers imports run by
+    other processes.
+    """
+
+    def __init__(self, poll_seconds=PRICE_UPDATE_POLL_SECONDS):
+        self.poll_seconds = poll_seconds
+        self.subscriptions = set()
+        self.latest = {}
+        self.version = None
+        self.watcher = None
+        self.lock = threading.Lock()
+        self.refresh_lock = threading.Lock()
+
+    def subscribe(self, stock_ids, deltas, version):
+        """
+        Subscribe the running event loop to ``stock_ids``, whose current
+        ``deltas`` the client has been sent as of price data ``version``.
+        """
+        subscription = Subscription(stock_ids, asyncio.get_running_loop())
+        with self.lock:
+            for delta in deltas:
+                self.latest.setdefault(delta['id'], delta)
+            if self.version is None:
+                self.version = version
+            self.subscriptions.add(subscription)
+            if self.watcher is None:
+                self.watcher = threading.Thread(target=self.watch, name='price-updates', daemon=True)
+                self.watcher.start()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            self.subscriptions.discard(subscription)
+            if not self.subscriptions:
+                # Nobody to compare against until the next subscriber sends a fresh snapshot.
+                self.latest.clear()
+                self.version = None
+
+    def refresh(self, version=None):
+        """
+        Publish the quotes of subscribed stocks that changed since they were
+        last sent. Runs no query when nobody is subscribed.
+        """
+        with self.refresh_lock:
+            with self.lock:
+                stock_ids = set().union(*(subscription.stock_ids for subscription in self.subscriptions))
+            if not stock_ids:
+                return
+            changed = [delta for delta in price_deltas(stock_ids) if self.latest.get(delta['id']) != delta]
+            with self.lock:
+                self.latest.update((delta['id'], delta) for delta in changed)
+                if version is not None:
+                    self.version = version
+            if changed:
+                self.publish(changed)
+
+    def publish(self, deltas):
+        with self.lock:
+            subscriptions = list(self.subscriptions)
+        for subscription in subscriptions:
+            matching = [delta for delta in deltas if delta['id'] in subscription.stock_ids]
+            if not matching:
+                continue
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.offer, matching)
+            except RuntimeError:
+                # The client's event loop is gone.
+                self.unsubscribe(subscription)
+
+    def watch(self):
+        while True:
+            time.sleep(self.poll_seconds)
+            with self.lock:
+                if not self.subscriptions:
+                    self.watcher = None
+                    return
+            try:
+                version = price_data_version()
+                if version != self.version:
+                    self.refresh(version)
+            except Exception:
+                logger.exception('Checking for new prices failed')
+            finally:
+                close_old_connections()
+
+
+price_updates = PriceUpdates()
+
+
+def sse_event(event, data):
+    # One Server-Sent Events message with a JSON payload.
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+async def price_stream(stock_ids, deltas, version, seconds=PRICE_STREAM_SECONDS):
+    """
+    Server-Sent Events of the given stocks: a ``snapshot`` event with their
+    current ``deltas``, then a ``prices`` event with the ones that changed
+    whenever new prices land. Ends after ``seconds``, and clients reconnect
+    (getting a fresh snapshot) after PRICE_STREAM_RETRY_MS.
+    """
+    subscription = price_updates.subscribe(stock_ids, deltas, version)
+    try:
+        yield f'retry: {PRICE_STREAM_RETRY_MS}\n\n'
+        yield sse_event('snapshot', deltas)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + seconds
+        while (remaining := deadline - loop.time()) > 0:
+            changed = await subscription.next(min(PRICE_STREAM_HEARTBEAT_SECONDS, remaining))
+            # A comment line keeps proxies from closing an idle connection.
+            yield sse_event('prices', changed) if changed else ': keep-alive\n\n'
+    finally:
+        price_updates.unsubscribe(subscription)
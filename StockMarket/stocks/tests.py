@@ -1,3 +1,646 @@
-from django.test import TestCase
+import json
+import math
+import os
+import struct
+import tempfile
+from datetime import date, timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock, skipUnless
+import pandas as pd
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Max
+from django.test import AsyncClient, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from knox.models import AuthToken
+from rest_framework.test import APIClient
+from accounts.auth import token_cache
+from frontend.risk import risk_metrics
+from stocks.analytics import comoment_matrix, refresh_metrics
+from stocks.caching import bump_price_data_version
+from stocks.models import ImportWatermark, Portfolio, PortfolioStock, Stock, StockPrice, Watchlist
+from stocks.prices import reference_price_ids
+from stocks.signals import prices_imported
 
-# Create your tests here.
+
+# The index Django creates for StockPrice's unique_together = ('stock', 'date').
+UNIQUE_INDEX = r'USING (COVERING )?INDEX stocks_stockprice_stock_id_date_\w+_uniq'
+
+
+@skipUnless(connection.vendor == 'sqlite', 'Query plans are checked against SQLite.')
+class StockPriceQueryPlanTests(TestCase):
+    """
+    The price lookups used by the API must be answered by index seeks on
+    StockPrice, never by scanning the table or sorting it. Per-stock lookups
+    use the (stock, date) unique index, read backwards for newest-first.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.stock = Stock.objects.create(ticker='TEST', company_name='Test Ltd.', series='EQ')
+        start = date(2020, 1, 1)
+        StockPrice.objects.bulk_create(
+            StockPrice(stock=cls.stock, date=start + timedelta(days=i), close_price=100 + i)
+            for i in range(400)
+        )
+
+    def assertIndexSeek(self, queryset):
+        plan = queryset.explain()
+        self.assertIn('SEARCH', plan)
+        self.assertRegex(plan, UNIQUE_INDEX)
+        self.assertNotRegex(plan, r'SCAN stocks_stockprice(?! USING)')
+        self.assertNotIn('TEMP B-TREE', plan)
+        return plan
+
+    def test_latest_price_is_index_seek(self):
+        self.assertIndexSeek(self.stock.prices.order_by('-date')[:1])
+
+    def test_as_of_date_price_is_index_seek(self):
+        self.assertIndexSeek(
+            self.stock.prices.filter(date__lte=date(2020, 6, 1)).order_by('-date')[:1]
+        )
+
+    def test_latest_date_overall_is_index_seek(self):
+        plan = StockPrice.objects.order_by('-date').values('date')[:1].explain()
+        self.assertRegex(plan, r'USING (COVERING )?INDEX stockprice_date_desc')
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_reference_price_subqueries_are_index_seeks(self):
+        with CaptureQueriesContext(connection) as queries:
+            ids = reference_price_ids([self.stock.pk])
+        self.assertEqual(len(queries.captured_queries), 1)
+        self.assertEqual(
+            StockPrice.objects.get(pk=ids[self.stock.pk]['week']).date,
+            StockPrice.objects.aggregate(Max('date'))['date__max'] - timedelta(days=7),
+        )
+
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN QUERY PLAN {queries.captured_queries[0]['sql']}")
+            plan = '\n'.join(row[-1] for row in cursor.fetchall())
+        self.assertIn('SEARCH', plan)
+        self.assertRegex(plan, UNIQUE_INDEX)
+        self.assertNotRegex(plan, r'SCAN (stocks_stockprice|U0)(?! USING)')
+        self.assertNotIn('TEMP B-TREE', plan)
+
+
+CSV_HEADER = 'Date,Symbol,Series,Prev Close,Open,High,Low,Last,Close,VWAP,Volume\n'
+
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+class CsvDatasetMixin:
+    """
+    A temporary dataset folder to write price CSVs into and run import_all_csv on.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.dataset = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dataset.cleanup)
+
+    def write_csv(self, name, days, close=100, mode='w', ticker='TCS'):
+        path = os.path.join(self.dataset.name, name)
+        with open(path, mode) as f:
+            if mode == 'w':
+                f.write(CSV_HEADER)
+            for day in days:
+                f.write(f'2021-01-{day:02d},{ticker},EQ,{close},{close},{close},{close},{close},{close},{close},1000\n')
+        return path
+
+    def write_metadata(self, *stocks):
+        with open(os.path.join(self.dataset.name, 'stock_metadata.csv'), 'w') as f:
+            f.write('Company Name,Industry,Symbol,Series,ISIN Code\n')
+            for ticker, company_name in stocks:
+                f.write(f'{company_name},IT,{ticker},EQ,\n')
+
+    def run_import(self):
+        out = StringIO()
+        call_command('import_all_csv', self.dataset.name, stdout=out)
+        return out.getvalue()
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ImportAllCsvTests(CsvDatasetMixin, TestCase):
+    """
+    import_all_csv skips unchanged files, only appends rows newer than a
+    file's watermark and tells receivers which stocks got new prices.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.stock = Stock.objects.create(ticker='TCS', company_name='Tata Consultancy Services', series='EQ')
+        self.imported = []
+        receiver = lambda sender, stock_ids, **kwargs: self.imported.append(set(stock_ids))
+        prices_imported.connect(receiver, sender=StockPrice, weak=False, dispatch_uid='test-import-all-csv')
+        self.addCleanup(prices_imported.disconnect, sender=StockPrice, dispatch_uid='test-import-all-csv')
+
+    def closes(self):
+        return dict(StockPrice.objects.filter(stock=self.stock).values_list('date__day', 'close_price'))
+
+    def test_unchanged_file_is_skipped(self):
+        self.write_csv('TCS.csv', [4, 5])
+        self.run_import()
+        self.assertEqual(len(self.closes()), 2)
+
+        output = self.run_import()
+        self.assertIn('Skipping 1 unchanged files.', output)
+        self.assertEqual(self.imported, [{self.stock.pk}])
+
+    def test_appended_rows_are_imported(self):
+        path = self.write_csv('TCS.csv', [4, 5])
+        self.run_import()
+        self.write_csv('TCS.csv', [6], close=110, mode='a')
+        self.run_import()
+
+        self.assertEqual(sorted(self.closes()), [4, 5, 6])
+        self.assertEqual(ImportWatermark.objects.get(source_file='TCS.csv').last_date, date(2021, 1, 6))
+        self.assertEqual(self.imported, [{self.stock.pk}, {self.stock.pk}])
+        self.assertIn('Skipping 1 unchanged files.', self.run_import())
+        self.assertTrue(os.path.exists(path))
+
+    def test_changed_file_without_new_rows_only_updates_the_watermark(self):
+        path = self.write_csv('TCS.csv', [4, 5])
+        self.run_import()
+        # Same size and dates, edited in place: only rows after the watermark are read.
+        self.write_csv('TCS.csv', [4, 5], close=200)
+        os.utime(path, ns=(0, 0))
+        self.run_import()
+
+        self.assertEqual(set(self.closes().values()), {100})
+        self.assertEqual(len(self.imported), 1)
+        self.assertEqual(ImportWatermark.objects.get(source_file='TCS.csv').file_mtime_ns, 0)
+        self.assertIn('Skipping 1 unchanged files.', self.run_import())
+
+    def test_several_files_can_feed_one_stock(self):
+        self.write_csv('TCS.csv', [4, 5])
+        self.write_csv('TCS_2021.csv', [6, 7], close=110)
+        self.run_import()
+
+        self.assertEqual(sorted(self.closes()), [4, 5, 6, 7])
+        watermarks = dict(ImportWatermark.objects.values_list('source_file', 'last_date'))
+        self.assertEqual(watermarks, {'TCS.csv': date(2021, 1, 5), 'TCS_2021.csv': date(2021, 1, 7)})
+        self.assertEqual(self.imported, [{self.stock.pk}])
+
+        # Each file keeps its own watermark, so rows appended to the older one still land.
+        self.write_csv('TCS.csv', [8], close=120, mode='a')
+        self.run_import()
+        self.assertEqual(sorted(self.closes()), [4, 5, 6, 7, 8])
+
+    def test_failed_refresh_is_retried_on_the_next_run(self):
+        self.write_csv('TCS.csv', [4, 5])
+
+        def fail(sender, **kwargs):
+            raise RuntimeError('refresh failed')
+
+        prices_imported.connect(fail, sender=StockPrice, dispatch_uid='test-import-all-csv-fail')
+        try:
+            with self.assertRaises(RuntimeError):
+                self.run_import()
+        finally:
+            prices_imported.disconnect(sender=StockPrice, dispatch_uid='test-import-all-csv-fail')
+        self.assertFalse(ImportWatermark.objects.exists())
+
+        self.run_import()
+        self.assertEqual(self.imported, [{self.stock.pk}, {self.stock.pk}])
+        self.assertTrue(ImportWatermark.objects.filter(source_file='TCS.csv').exists())
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class AsyncViewTests(TestCase):
+    """
+    AsyncViewMixin.dispatch goes through the same authentication, exception
+    and conditional GET steps as DRF's APIView.dispatch.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.stock = Stock.objects.create(ticker='TCS', company_name='Tata Consultancy Services', series='EQ')
+        cls.user = User.objects.create_user('trader', password='secret')
+        cls.token = AuthToken.objects.create(cls.user)[1]
+
+    def setUp(self):
+        token_cache.clear()
+        self.addCleanup(token_cache.clear)
+        self.client = AsyncClient()
+        self.auth = {'Authorization': f'Token {self.token}'}
+
+    async def test_authenticated_read(self):
+        response = await self.client.get('/api/stocks/', headers=self.auth)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([stock['ticker'] for stock in response.json()], ['TCS'])
+
+        response = await self.client.get(f'/api/stocks/{self.stock.pk}/', headers=self.auth)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['ticker'], 'TCS')
+
+    async def test_missing_token_is_unauthorized(self):
+        response = await self.client.get('/api/stocks/')
+        self.assertEqual(response.status_code, 401)
+        self.assertIn('WWW-Authenticate', response)
+
+    async def test_unknown_object_is_not_found(self):
+        for path in (f'/api/stocks/{self.stock.pk + 1}/', '/api/stocks/abc/'):
+            response = await self.client.get(path, headers=self.auth)
+            self.assertEqual(response.status_code, 404, path)
+
+    async def test_unchanged_response_is_not_modified(self):
+        response = await self.client.get('/api/stocks/', headers=self.auth)
+        etag = response['ETag']
+
+        response = await self.client.get('/api/stocks/', headers={**self.auth, 'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(response.content, b'')
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class PortfolioApiTests(TestCase):
+    """
+    Portfolio actions that value holdings at stored close prices.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('trader', password='secret')
+        cls.tcs = Stock.objects.create(ticker='TCS', company_name='Tata Consultancy Services', series='EQ')
+        cls.infy = Stock.objects.create(ticker='INFY', company_name='Infosys', series='EQ')
+        cls.wipro = Stock.objects.create(ticker='WIPRO', company_name='Wipro', series='EQ')
+        StockPrice.objects.bulk_create(
+            StockPrice(stock=stock, date=date(2021, 1, day), close_price=close + day)
+            for stock, close in ((cls.tcs, 100), (cls.infy, 50))
+            for day in range(4, 9)
+        )
+        cls.portfolio = Portfolio.objects.create(owner=cls.user, name='Core', description='')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def hold(self, stock, shares, buy_price=10):
+        return PortfolioStock.objects.create(portfolio=self.portfolio, stock=stock, shares=shares, buy_price=buy_price)
+
+    def url(self, action):
+        return f'/api/portfolios/{self.portfolio.pk}/{action}/'
+
+    def test_equity_leaves_out_holdings_without_prices(self):
+        self.hold(self.tcs, 2)
+        self.hold(self.wipro, 5)
+        response = self.client.get(self.url('equity'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['date']), 5)
+        self.assertEqual(response.data['value'][0], 2 * 104)
+
+    def test_equity_follows_prices_rewritten_in_place(self):
+        self.hold(self.tcs, 2)
+        self.assertEqual(self.client.get(self.url('equity')).data['value'][0], 2 * 104)
+        # Corrected history, as import_all_csv --full writes it: same newest date.
+        StockPrice.objects.filter(stock=self.tcs, date=date(2021, 1, 4)).update(close_price=200)
+        bump_price_data_version()
+        self.assertEqual(self.client.get(self.url('equity')).data['value'][0], 2 * 200)
+
+    def positions(self, method, data):
+        return getattr(self.client, method)(self.url('positions'), data, format='json')
+
+    def holdings(self):
+        return dict(PortfolioStock.objects.filter(portfolio=self.portfolio).values_list('stock__ticker', 'shares'))
+
+    def test_positions_are_all_or_nothing(self):
+        self.hold(self.tcs, 1)
+        for positions in (
+            [{'stock': 'INFY', 'buy_price': 10, 'shares': 3}, {'stock': 'TCS', 'buy_price': 10, 'shares': 'x'}],
+            [{'stock': 'INFY', 'buy_price': 10, 'shares': 3}, {'stock': 'NOPE', 'buy_price': 10, 'shares': 1}],
+        ):
+            response = self.positions('post', {'positions': positions})
+            self.assertEqual(response.status_code, 400, positions)
+            self.assertEqual(self.holdings(), {'TCS': 1})
+
+    def test_positions_reject_duplicate_stocks(self):
+        positions = [
+            {'stock': 'TCS', 'buy_price': 10, 'shares': 1},
+            {'stock': str(self.tcs.pk), 'buy_price': 12, 'shares': 2},
+        ]
+        response = self.positions('post', {'positions': positions})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.holdings(), {})
+
+    def test_positions_put_replaces_holdings(self):
+        self.hold(self.tcs, 1)
+        self.hold(self.infy, 1)
+        positions = [{'stock': 'INFY', 'buy_price': 10, 'shares': 4}, {'stock': 'WIPRO', 'buy_price': 10, 'shares': 5}]
+        response = self.positions('put', {'positions': positions})
+        self.assertEqual(response.data, {'created': 1, 'updated': 1, 'deleted': 1})
+        self.assertEqual(self.holdings(), {'INFY': 4, 'WIPRO': 5})
+
+        # POST upserts and keeps the holdings it doesn't mention.
+        response = self.positions('post', {'positions': [{'stock': 'TCS', 'buy_price': 10, 'shares': 1}]})
+        self.assertEqual(response.data, {'created': 1, 'updated': 0, 'deleted': 0})
+        self.assertEqual(self.holdings(), {'INFY': 4, 'WIPRO': 5, 'TCS': 1})
+
+    def test_positions_reject_non_object_bodies(self):
+        self.hold(self.tcs, 1)
+        for method in ('post', 'put', 'delete'):
+            response = self.positions(method, ['TCS'])
+            self.assertEqual(response.status_code, 400, method)
+        self.assertEqual(self.holdings(), {'TCS': 1})
+
+    def test_summary_totals_agree_with_an_unpriced_holding(self):
+        self.hold(self.tcs, 2, buy_price=10)
+        self.hold(self.wipro, 5, buy_price=10)
+        data = self.client.get(self.url('summary')).data
+        totals = {name: Decimal(data[name]) for name in ('market_value', 'cost_basis', 'unrealised_pnl', 'unvalued_cost_basis')}
+        self.assertEqual(totals, {
+            'market_value': 2 * 108, 'cost_basis': 2 * 10, 'unrealised_pnl': 2 * 98, 'unvalued_cost_basis': 5 * 10,
+        })
+        self.assertEqual(totals['market_value'] - totals['cost_basis'], totals['unrealised_pnl'])
+        self.assertEqual([holding['weight'] for holding in data['stocks']], [1.0, None])
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ReturnMatrixTests(TestCase):
+
+    def test_matrix_follows_prices_rewritten_in_place(self):
+        tcs = Stock.objects.create(ticker='TCS', company_name='Tata Consultancy Services', series='EQ')
+        StockPrice.objects.bulk_create(
+            StockPrice(stock=tcs, date=date(2021, 1, day), close_price=close)
+            for day, close in ((4, 100), (5, 110), (6, 99))
+        )
+        before = comoment_matrix([tcs.pk], 'covariance')
+        StockPrice.objects.filter(stock=tcs, date=date(2021, 1, 4)).update(close_price=50)
+        bump_price_data_version()
+        self.assertNotEqual(comoment_matrix([tcs.pk], 'covariance'), before)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ConditionalGetTests(CsvDatasetMixin, TestCase):
+    """
+    ETags only change when data the response is built from changes, and
+    clients holding the current one get 304.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('trader', password='secret')
+        self.stock = Stock.objects.create(ticker='TCS', company_name='Tata Consultancy Services', series='EQ')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def etag(self, path):
+        response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        return response['ETag']
+
+    def assertNotModified(self, path, etag):
+        self.assertEqual(self.client.get(path, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def assertModified(self, path, etag):
+        response = self.client.get(path, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_not_modified_until_prices_are_imported(self):
+        etag = self.etag('/api/stocks/')
+        self.assertNotModified('/api/stocks/', etag)
+        self.assertNotModified('/api/stocks/', etag)
+
+        self.write_csv('TCS.csv', [4, 5])
+        self.run_import()
+        self.assertModified('/api/stocks/', etag)
+
+    def test_watchlist_etag_changes_with_the_watchlist(self):
+        etag = self.etag('/api/watchlist/')
+        self.assertNotModified('/api/watchlist/', etag)
+        self.client.post(f'/api/watchlist/{self.stock.pk}/')
+        self.assertModified('/api/watchlist/', etag)
+
+    def test_renamed_stock_is_modified(self):
+        etag = self.etag('/api/stocks/')
+        self.write_metadata(('TCS', 'Tata Consultancy Services Ltd.'))
+        self.run_import()
+        self.assertModified('/api/stocks/', etag)
+
+        # A run that changes nothing keeps the ETag.
+        etag = self.etag('/api/stocks/')
+        self.run_import()
+        self.assertNotModified('/api/stocks/', etag)
+
+    def test_refresh_commands_are_modified(self):
+        StockPrice.objects.create(stock=self.stock, date=date(2021, 1, 4), close_price=100)
+        for command in ('refresh_snapshots', 'refresh_metrics'):
+            etag = self.etag('/api/stocks/screen/')
+            call_command(command, stdout=StringIO())
+            self.assertModified('/api/stocks/screen/', etag)
+        self.assertEqual([stock['ticker'] for stock in self.client.get('/api/stocks/screen/').data], ['TCS'])
+
+    def test_other_methods_ignore_validators(self):
+        etag = self.etag('/api/stocks/')
+        self.assertEqual(self.client.options('/api/stocks/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        self.assertEqual(self.client.post('/api/stocks/', {}, HTTP_IF_NONE_MATCH=etag).status_code, 405)
+        self.assertEqual(self.client.head('/api/stocks/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class UserResponseCacheTests(CsvDatasetMixin, TestCase):
+    """
+    Cached watchlist and portfolio responses are rebuilt after any change to
+    the user's data or to the stocks and prices they show.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('trader', password='secret')
+        self.stock = Stock.objects.create(ticker='TCS', company_name='Tata Consultancy Services', series='EQ')
+        self.portfolio = Portfolio.objects.create(owner=self.user, name='Core', description='')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def watchlist(self):
+        return self.client.get('/api/watchlist/').data['stocks']
+
+    def holdings(self):
+        return self.client.get(f'/api/portfolios/{self.portfolio.pk}/').data['stocks']
+
+    def test_watchlist_change(self):
+        self.assertEqual(self.watchlist(), [])
+        self.client.post('/api/watchlist/bulk/', {'add': ['TCS']}, format='json')
+        self.assertEqual([stock['ticker'] for stock in self.watchlist()], ['TCS'])
+
+    def test_position_write(self):
+        self.assertEqual(self.holdings(), [])
+        positions = {'positions': [{'stock': 'TCS', 'buy_price': 10, 'shares': 3}]}
+        self.client.post(f'/api/portfolios/{self.portfolio.pk}/positions/', positions, format='json')
+        self.assertEqual([(holding['ticker'], holding['shares']) for holding in self.holdings()], [('TCS', '3.0000')])
+
+    def test_price_import(self):
+        self.client.post(f'/api/watchlist/{self.stock.pk}/')
+        PortfolioStock.objects.create(portfolio=self.portfolio, stock=self.stock, buy_price=10, shares=1)
+        self.assertIsNone(self.watchlist()[0]['latest_price'])
+        self.assertIsNone(self.holdings()[0]['current_close'])
+
+        self.write_csv('TCS.csv', [4, 5], close=120)
+        self.run_import()
+        self.assertEqual(self.watchlist()[0]['latest_price']['close_price'], '120.0000')
+        self.assertEqual(self.holdings()[0]['current_close'], Decimal('120'))
+
+    def test_metadata_only_import(self):
+        self.client.post(f'/api/watchlist/{self.stock.pk}/')
+        self.write_csv('TCS.csv', [4, 5])
+        self.write_metadata(('TCS', 'Tata Consultancy Services'))
+        self.run_import()
+        self.assertEqual(self.watchlist()[0]['company_name'], 'Tata Consultancy Services')
+
+        # Every price file is unchanged; only the name is new.
+        self.write_metadata(('TCS', 'TCS Ltd.'))
+        self.assertIn('Skipping 1 unchanged files.', self.run_import())
+        self.assertEqual(self.watchlist()[0]['company_name'], 'TCS Ltd.')
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class BulkWatchlistTests(TestCase):
+    """
+    /api/watchlist/bulk/ applies every change or none.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('trader', password='secret')
+        cls.tcs = Stock.objects.create(ticker='TCS', company_name='Tata Consultancy Services', series='EQ')
+        cls.infy = Stock.objects.create(ticker='INFY', company_name='Infosys', series='EQ')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def bulk(self, data):
+        return self.client.post('/api/watchlist/bulk/', data, format='json')
+
+    def watched(self):
+        return set(Watchlist.stocks.through.objects.filter(watchlist__owner=self.user).values_list('stock_id', flat=True))
+
+    def test_unknown_ticker_rejects_the_whole_request(self):
+        response = self.bulk({'add': ['TCS', 'NOPE'], 'remove': ['INFY']})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('NOPE', str(response.data['add']))
+        self.assertEqual(self.watched(), set())
+
+    def test_duplicates_are_added_once(self):
+        response = self.bulk({'add': ['TCS', 'tcs', str(self.tcs.pk), self.tcs.pk]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['added'], [self.tcs.pk])
+        self.assertEqual(self.watched(), {self.tcs.pk})
+
+        response = self.bulk({'add': ['TCS', 'INFY']})
+        self.assertEqual(response.data['added'], [self.infy.pk])
+
+    def test_malformed_bodies_are_rejected(self):
+        for data in ([self.tcs.pk], {'add': 'TCS'}, {'add': [None]}):
+            response = self.bulk(data)
+            self.assertEqual(response.status_code, 400, data)
+        self.assertEqual(self.bulk({'add': ['TCS'], 'remove': ['TCS']}).status_code, 400)
+        self.assertEqual(self.watched(), set())
+
+    def test_stock_added_concurrently_is_tolerated(self):
+        watchlist = Watchlist.objects.create(owner=self.user)
+        watchlist.stocks.add(self.tcs)
+        # As if another request created the watchlist and added TCS after this one looked.
+        with mock.patch.object(Watchlist.objects, 'get_or_create', return_value=(watchlist, True)):
+            response = self.bulk({'add': ['TCS', 'INFY']})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.watched(), {self.tcs.pk, self.infy.pk})
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class StoredRiskTests(TestCase):
+    """
+    ?window=N risk is read from StockMetric and matches recomputing it from
+    the last N + 1 closes.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('trader', password='secret')
+        cls.closes = {}
+        for ticker, days, phase in (('TCS', 300, 0), ('INFY', 300, 1), ('NEW', 10, 2)):
+            stock = Stock.objects.create(ticker=ticker, company_name=ticker, series='EQ')
+            cls.closes[stock.pk] = [round(100 + 10 * math.sin(day / 7 + phase) + day / 10, 2) for day in range(days)]
+            StockPrice.objects.bulk_create(
+                StockPrice(stock=stock, date=date(2020, 1, 1) + timedelta(days=day), close_price=close)
+                for day, close in enumerate(cls.closes[stock.pk])
+            )
+        refresh_metrics(cls.closes)
+        cls.portfolio = Portfolio.objects.create(owner=cls.user, name='Core', description='')
+        for stock_id, shares in zip(cls.closes, (2, 3)):
+            PortfolioStock.objects.create(portfolio=cls.portfolio, stock_id=stock_id, buy_price=10, shares=shares)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def expected(self, closes, window):
+        return risk_metrics(pd.DataFrame({'close': closes[-(window + 1):]})).iloc[0]
+
+    def assertRiskEqual(self, row, expected):
+        for factor in ('volatility', 'sharpe_ratio', 'max_drawdown'):
+            self.assertAlmostEqual(row[factor], expected[factor], places=9, msg=factor)
+
+    def test_stock_risk_is_read_from_stored_metrics(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/stocks/risk/?window=20')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([query for query in queries.captured_queries if 'stocks_stockprice' in query['sql']])
+
+        rows = {row['id']: row for row in response.data}
+        for stock_id, closes in self.closes.items():
+            if len(closes) > 20:
+                self.assertRiskEqual(rows[stock_id], self.expected(closes, 20))
+            else:
+                self.assertEqual({rows[stock_id][factor] for factor in ('volatility', 'sharpe_ratio', 'max_drawdown')}, {None})
+
+    def test_portfolio_risk_over_a_stored_window(self):
+        response = self.client.get(f'/api/portfolios/{self.portfolio.pk}/risk/?window=60')
+        self.assertEqual(response.status_code, 200)
+        for row in response.data['stocks']:
+            self.assertRiskEqual(row, self.expected(self.closes[row['id']], 60))
+        values = [2 * tcs + 3 * infy for tcs, infy in zip(*list(self.closes.values())[:2])]
+        self.assertRiskEqual(response.data, self.expected(values, 60))
+
+    def test_window_is_validated(self):
+        for query in ('window=30', 'window=x', 'window=20&days=30'):
+            self.assertEqual(self.client.get(f'/api/stocks/risk/?{query}').status_code, 400, query)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ColumnarBinaryTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('trader', password='secret')
+        stock = Stock.objects.create(ticker='TCS', company_name='Tata Consultancy Services', series='EQ')
+        StockPrice.objects.bulk_create(
+            StockPrice(stock=stock, date=date(2021, 1, day), close_price=100 + day) for day in range(4, 9)
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_columns_are_packed(self):
+        response = self.client.get('/api/prices/columns/?ticker=TCS&fields=close&format=bin')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/octet-stream')
+        (length,) = struct.unpack_from('<I', response.content)
+        self.assertEqual(json.loads(response.content[4:4 + length])['length'], 5)
+
+    def test_errors_are_json(self):
+        for path, status in (
+            ('/api/prices/columns/?ticker=TCS&fields=bogus', 400),
+            ('/api/prices/columns/?ticker=NOPE', 404),
+            ('/api/portfolios/999/equity/', 404),
+        ):
+            for request in ({'path': f'{path}&format=bin' if '?' in path else f'{path}?format=bin'},
+                            {'path': path, 'HTTP_ACCEPT': 'application/octet-stream'}):
+                response = self.client.get(**request)
+                self.assertEqual(response.status_code, status, request)
+                self.assertEqual(response['Content-Type'], 'application/json', request)
+                self.assertIn('detail' if status == 404 else 'fields', response.json())
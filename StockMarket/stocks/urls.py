@@ -1,16 +1,19 @@
 from rest_framework.routers import DefaultRouter
-from .api import StockViewSet, PortfolioViewSet
+from .api import StockViewSet, StockPriceViewSet, PortfolioViewSet
 from django.urls import path
-from stocks.api import get_watchlist, change_watchlist
+from stocks.api import get_watchlist, change_watchlist, bulk_change_watchlist, PriceStreamView
 
 urlpatterns = [
     path('api/watchlist/', get_watchlist, name='get_watchlist'),
+    path('api/watchlist/bulk/', bulk_change_watchlist, name='bulk_change_watchlist'),
     path('api/watchlist/<int:stock_id>', change_watchlist, name='change_watchlist'),  # Use POST to add
     path('api/watchlist/<int:stock_id>/', change_watchlist, name='change_watchlist'),
+    path('api/stream/prices/', PriceStreamView.as_view(), name='price_stream'),
 ]
 
 router = DefaultRouter()
 router.register('api/stocks', StockViewSet, basename='stock')
+router.register('api/prices', StockPriceViewSet, basename='stockprice')
 router.register('api/portfolios', PortfolioViewSet, basename='portfolio')
 # router.register('api/watchlists', WatchlistViewSet, basename='watchlist')
 